@@ -1,10 +1,14 @@
+import os
 from flask import Flask, request, jsonify, abort
 
+from greeting_store import GreetingStore, is_text
+from negotiation import get_negotiator
+
 app = Flask(__name__)
 
-greetings = {
-            'en': 'hello', 
-            'es': 'Hola', 
+default_greetings = {
+            'en': 'hello',
+            'es': 'Hola',
             'ar': 'مرحبا',
             'ru': 'Привет',
             'fi': 'Hei',
@@ -12,22 +16,53 @@ greetings = {
             'ja': 'こんにちは'
             }
 
+# every worker that points at the same file shares the greetings
+greetings_path = os.environ.get(
+    'GREETINGS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'greetings.log'))
+greetings = GreetingStore(greetings_path, default_greetings)
+
+def snapshot_response(snapshot):
+    return app.response_class(snapshot.body, mimetype='application/json')
+
+def negotiator(snapshot):
+    # rebuilt only when the set of languages changes
+    return get_negotiator(frozenset(snapshot.greetings), 'en')
+
+def greeting_response(snapshot, lang):
+    response = jsonify({'greeting': snapshot.greetings[lang], 'lang': lang})
+    response.headers['Content-Language'] = lang
+    return response
+
 @app.route('/greeting', methods=['GET'])
 def greeting_all():
-    return jsonify({'greetings': greetings})
+    return snapshot_response(greetings.get())
+
+@app.route('/greeting/preferred', methods=['GET'])
+def greeting_preferred():
+    snapshot = greetings.get()
+    lang = negotiator(snapshot).best_match(
+        request.headers.get('Accept-Language', ''))
+    if(lang is None):
+        abort(406)
+    response = greeting_response(snapshot, lang)
+    response.vary.add('Accept-Language')
+    return response
 
 @app.route('/greeting/<lang>', methods=['GET'])
 def greeting_one(lang):
-    print(lang)
-    if(lang not in greetings):
-        abort(404)
-    return jsonify({'greeting': greetings[lang
-    ]})
+    snapshot = greetings.get()
+    if(lang not in snapshot.greetings):
+        # en-GB falls back to en
+        lang = negotiator(snapshot).trie.lookup(lang.lower())
+        if(lang is None):
+            abort(404)
+    return greeting_response(snapshot, lang)
 
 @app.route('/greeting', methods=['POST'])
 def greeting_add():
     info = request.get_json()
-    if('lang' not in info or 'greeting' not in info):
+    if(not isinstance(info, dict) or not is_text(info.get('lang'))
+       or not is_text(info.get('greeting'))):
         abort(422)
-    greetings[info['lang']] = info['greeting']
-    return jsonify({'greetings':greetings})
+    return snapshot_response(greetings.put(info['lang'], info['greeting']))
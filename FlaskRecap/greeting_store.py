@@ -0,0 +1,197 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+
+# An immutable view of the greetings. Writers build a new Snapshot and swap
+# it in, so a reader holding one is never affected by a later write.
+# `body` is the pre-serialized GET /greeting response.
+Snapshot = namedtuple('Snapshot', ['greetings', 'body'])
+
+logger = logging.getLogger(__name__)
+
+
+def is_text(value):
+    return isinstance(value, str) and value.strip() != ''
+
+
+def parse_entry(line):
+    '''
+    Returns the (lang, greeting) of a log line, or None when the line is
+    not an entry with two non-empty strings.
+    '''
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    lang, greeting = entry.get('lang'), entry.get('greeting')
+    if not is_text(lang) or not is_text(greeting):
+        return None
+    return lang, greeting
+
+
+class GreetingStore:
+    '''
+    GreetingStore
+    greetings kept in memory as copy-on-write snapshots and persisted in
+    an append-only log of JSON lines, {"lang": ..., "greeting": ...}.
+
+    Every process that opens the same log converges on the same data:
+    writes take an exclusive lock on `<path>.lock`, read what other
+    processes appended, then append their own entry. Reads return the
+    current snapshot without waiting on either lock, see get(). Once the log holds more than
+    `compact_after` superseded entries it is rewritten with one entry per
+    language and swapped in with os.replace().
+    '''
+
+    def __init__(self, path, defaults=None, compact_after=1000):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.compact_after = compact_after
+        self.thread_lock = threading.Lock()
+        self.greetings = {}
+        self.entries = 0
+        # identity of the log file that was read and how far
+        self.inode = None
+        self.offset = 0
+        self.snapshot = self.make_snapshot()
+
+        with self.locked(fcntl.LOCK_EX):
+            if not os.path.exists(self.path) and defaults:
+                self.write_log(defaults)
+            self.refresh()
+
+    @contextmanager
+    def locked(self, operation):
+        '''
+        Serializes threads with a lock and processes with flock().
+        '''
+        with self.thread_lock:
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, operation)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def make_snapshot(self):
+        greetings = dict(self.greetings)
+        body = json.dumps({'greetings': greetings}).encode('utf-8')
+        return Snapshot(MappingProxyType(greetings), body)
+
+    def log_changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.inode is not None
+        return stat.st_ino != self.inode or stat.st_size != self.offset
+
+    def refresh(self):
+        '''
+        Applies what was appended to the log since the last read, or reads
+        it from the start when it was compacted. Runs under the lock.
+        '''
+        try:
+            log = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with log:
+            inode = os.fstat(log.fileno()).st_ino
+            changed = inode != self.inode
+            if changed:
+                self.greetings = {}
+                self.entries = 0
+                self.inode = inode
+                self.offset = 0
+            log.seek(self.offset)
+            for line in log:
+                if not line.endswith(b'\n'):
+                    # a write that did not finish, it is read once complete
+                    break
+                self.offset += len(line)
+                # a skipped line counts as superseded, compaction drops it
+                self.entries += 1
+                entry = parse_entry(line)
+                if entry is None:
+                    # a bad line must not stop the app from starting
+                    logger.warning('skipping malformed line in %s: %r',
+                                   self.path, line)
+                    continue
+                self.greetings[entry[0]] = entry[1]
+                changed = True
+        if changed:
+            self.snapshot = self.make_snapshot()
+
+    def try_refresh(self):
+        '''
+        Refreshes unless a writer or another refresh holds a lock, in
+        which case the current snapshot stays until a later read.
+        '''
+        if not self.thread_lock.acquire(blocking=False):
+            return
+        try:
+            with open(self.lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+                try:
+                    self.refresh()
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            self.thread_lock.release()
+
+    def get(self):
+        '''
+        Returns the current Snapshot and never waits for a lock. Writes in
+        this process swap in their snapshot themselves, writes by other
+        processes are picked up by the first read that finds the log
+        changed and unlocked.
+        '''
+        if self.log_changed():
+            self.try_refresh()
+        return self.snapshot
+
+    def put(self, lang, greeting):
+        '''
+        Durably stores a greeting and returns the new Snapshot. Raises
+        ValueError unless lang and greeting are non-empty strings.
+        '''
+        if not is_text(lang) or not is_text(greeting):
+            raise ValueError('lang and greeting must be non-empty strings')
+        line = json.dumps({'lang': lang, 'greeting': greeting}) + '\n'
+        with self.locked(fcntl.LOCK_EX):
+            self.refresh()
+            with open(self.path, 'ab') as log:
+                log.write(line.encode('utf-8'))
+                log.flush()
+                os.fsync(log.fileno())
+            self.refresh()
+            if self.entries - len(self.greetings) > self.compact_after:
+                self.compact()
+            return self.snapshot
+
+    def compact(self):
+        '''
+        Rewrites the log with the current greetings only. Runs under the
+        exclusive lock, readers in other processes notice the new inode.
+        '''
+        self.write_log(self.greetings)
+        self.refresh()
+
+    def write_log(self, greetings):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as log:
+            for lang, greeting in greetings.items():
+                log.write((json.dumps({'lang': lang, 'greeting': greeting})
+                           + '\n').encode('utf-8'))
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(temp_path, self.path)
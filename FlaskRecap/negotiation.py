@@ -0,0 +1,87 @@
+from functools import lru_cache
+
+
+def parse_accept_language(header):
+    '''
+    parse_accept_language(header)
+        returns the language ranges of an Accept-Language header as
+        lowercase tags, best quality first, ranges with q=0 or a
+        malformed quality are left out
+    '''
+    ranges = []
+    for position, part in enumerate(header.split(',')):
+        tag, _, params = part.strip().partition(';')
+        tag = tag.strip().lower()
+        if not tag:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if 0 < quality <= 1:
+            # equal qualities keep the order of the header
+            ranges.append((-quality, position, tag))
+    return [tag for _, _, tag in sorted(ranges)]
+
+
+class LanguageTrie:
+    '''
+    LanguageTrie
+    the available languages split into subtags, so a range such as
+    en-gb-oxendict resolves to the longest available prefix (en-gb, then
+    en) in one walk
+    '''
+
+    def __init__(self, languages):
+        self.root = {}
+        for language in languages:
+            node = self.root
+            for subtag in language.lower().split('-'):
+                node = node.setdefault(subtag, {})
+            node[None] = language
+
+    def lookup(self, tag):
+        node = self.root
+        best = None
+        for subtag in tag.split('-'):
+            node = node.get(subtag)
+            if node is None:
+                break
+            best = node.get(None, best)
+        return best
+
+
+class LanguageNegotiator:
+    '''
+    LanguageNegotiator
+    picks the best available language for an Accept-Language header, the
+    answer for every distinct header is cached
+    '''
+
+    def __init__(self, languages, default=None, cache_size=256):
+        self.languages = languages
+        self.trie = LanguageTrie(languages)
+        self.default = default if default in languages else None
+        self.best_match = lru_cache(maxsize=cache_size)(self.negotiate)
+
+    def negotiate(self, header):
+        for tag in parse_accept_language(header or ''):
+            if tag == '*':
+                return self.default or min(self.languages, default=None)
+            language = self.trie.lookup(tag)
+            if language is not None:
+                return language
+        return self.default
+
+
+@lru_cache(maxsize=8)
+def get_negotiator(languages, default=None):
+    '''
+    get_negotiator(languages, default)
+        one negotiator, with its own cache, per set of available languages
+    '''
+    return LanguageNegotiator(languages, default)
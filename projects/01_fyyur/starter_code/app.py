@@ -3,6 +3,9 @@
 #----------------------------------------------------------------------------#
 
 import json
+import time
+import click
+from datetime import datetime, timedelta
 import dateutil.parser
 import babel
 from flask import (
@@ -12,17 +15,25 @@ from flask import (
     Response, 
     flash, 
     redirect, 
-    url_for
+    url_for,
+    jsonify,
+    abort
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
-from logging import Formatter, FileHandler
+from fsnd_shared.request_logging import setup_logging
 from flask_wtf import Form
 from forms import *
 from config import SQLALCHEMY_DATABASE_URI
 from flask_migrate import Migrate
-from models import db, Venue, Artist, Show
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from genre_facets import genre_filter, genre_counts, mark_changed
+from availability import find_conflict, free_slots, MAX_RANGE
+import leaderboard
+import date_format
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -42,14 +53,9 @@ db.init_app(app)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  # date = dateutil.parser.parse(value.strftime(%c))
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return value
-  # return babel.dates.format_datetime(date, format)
+def format_datetime(value, format='medium', locale=None):
+  # DATETIME_LOCALE (config.py) unless the template passes a locale
+  return date_format.format_datetime(value, format, locale or app.config['DATETIME_LOCALE'])
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -59,7 +65,43 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 @app.route('/')
 def index():
-  return render_template('pages/home.html')
+  # reads the leaderboard tables, only counts the shows started since the last rebuild
+  return render_template('pages/home.html',
+    trending_venues=leaderboard.trending(Venue),
+    trending_artists=leaderboard.trending(Artist),
+    new_venues=leaderboard.recently_listed(Venue),
+    new_artists=leaderboard.recently_listed(Artist))
+
+@app.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard():
+  '''Recounts the upcoming and total shows of every venue and artist.'''
+  leaderboard.rebuild()
+
+@app.cli.command('purge-shows')
+@click.option('--days', default=365, show_default=True, help='Delete the shows that ended more than this many days ago.')
+@click.option('--batch-size', default=1000, show_default=True, help='Shows deleted per transaction.')
+@click.option('--pause', default=0.1, show_default=True, help='Seconds to wait between two batches.')
+def purge_shows(days, batch_size, pause):
+  '''
+  Deletes past shows in batches. Each batch is its own short transaction,
+  so the rows and index pages it locks are released before the next one.
+  '''
+  cutoff = datetime.now() - timedelta(days=days)
+  total = 0
+  while True:
+    # end_time <= start_time + a day, so start_time (indexed) bounds it
+    ids = [id for (id,) in db.session.query(Show.id)
+      .filter(Show.start_time < cutoff, Show.end_time < cutoff)
+      .order_by(Show.start_time).limit(batch_size)]
+    if not ids:
+      break
+    batch = Show.id.in_(ids)
+    leaderboard.uncount_shows(batch)
+    total += Show.query.filter(batch).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo('Deleted ' + str(total) + ' shows')
+    time.sleep(pause)
+  click.echo('Done, ' + str(total) + ' shows before ' + str(cutoff) + ' deleted.')
 
 
 #  Venues
@@ -67,7 +109,12 @@ def index():
 
 @app.route('/venues')
 def venues():
-  venueList = Venue.query.group_by(Venue.id, Venue.city, Venue.state).all()
+  # /venues?genre=Jazz&genre=Folk lists the venues with all of the genres
+  genres = request.args.getlist('genre')
+  query = Venue.query
+  if genres:
+    query = query.filter(genre_filter(Venue, genres))
+  venueList = query.group_by(Venue.id, Venue.city, Venue.state).all()
   current_time = datetime.now().strftime('%c')
   city = ''
   state = ''
@@ -96,7 +143,7 @@ def venues():
           "num_upcoming_shows": len(upcoming_shows)
         }]
       })
-  return render_template('pages/venues.html', areas=data)
+  return render_template('pages/venues.html', areas=data, genres=genres, facets=genre_counts(app, Venue))
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
@@ -190,49 +237,52 @@ def create_venue_submission():
     db.session.close()
   return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
+def delete_listing(model, show_column, id, name):
+  '''
+  Deletes a venue or an artist with a single DELETE, the database removes
+  its shows, genres and leaderboard row (ON DELETE CASCADE). Answers with
+  JSON, 404 when it does not exist and 500 when the delete fails.
+  '''
   try:
-    venue = Venue.query.get(venue_id)
-    if venue:
-      Venue.query.filter_by(id=venue_id).delete()
-      db.session.commit()
-      flash('Venue ' + name + ' was successfully listed!')
-  except:
+    # the cascade skips the ORM events, so the leaderboard and the genre
+    # counts are told directly
+    leaderboard.uncount_shows(show_column == id)
+    deleted = model.query.filter_by(id=id).delete(synchronize_session=False)
+    mark_changed(db.session, model)
+    db.session.commit()
+  except SQLAlchemyError:
     db.session.rollback()
-    flash('An error occurred. Venue ' + venue.name + ' could not be deleted.')
+    app.logger.exception('Deleting ' + name + ' ' + str(id) + ' failed')
+    return jsonify({'success': False, 'error': 500, 'message': name + ' could not be deleted'}), 500
   finally:
     # Always close database session.
     db.session.close()
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
-  return render_template('pages/home.html')
+  if not deleted:
+    return jsonify({'success': False, 'error': 404, 'message': name + ' not found'}), 404
+  return jsonify({'success': True, 'deleted': id})
+
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  return delete_listing(Venue, Show.venue_id, venue_id, 'venue')
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-  data = []
-  artistList = Artist.query.order_by(Artist.name).all()
-  for artist in artistList:
-    data.append({
-      "id": artist.id,
-      "name": artist.name
-    })
-  return render_template('pages/artists.html', artists=data)
+  # named (id, name) rows, the page never needs the full Artist objects
+  genres = request.args.getlist('genre')
+  query = db.session.query(Artist.id, Artist.name)
+  if genres:
+    query = query.filter(genre_filter(Artist, genres))
+  data = query.order_by(Artist.name).all()
+  return render_template('pages/artists.html', artists=data, genres=genres, facets=genre_counts(app, Artist))
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  data = []
-  artistList = Artist.query.filter(Artist.name.ilike('%' + request.form['search_term'] + '%')).all()
-  for artist in artistList:
-    data.append({
-      "id": artist.id,
-      "name": artist.name
-    })
+  data = db.session.query(Artist.id, Artist.name).filter(Artist.name.ilike('%' + request.form['search_term'] + '%')).all()
 
   response = {
-    "count": len(artistList),
+    "count": len(data),
     "data": data
   }
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
@@ -284,6 +334,36 @@ def show_artist(artist_id):
 
 #  Update
 #  ----------------------------------------------------------------
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  return delete_listing(Artist, Show.artist_id, artist_id, 'artist')
+
+def save_changes(entity, values):
+  '''
+  Saves the submitted values of an edit form that differ from the stored
+  ones, the UPDATE lists only those columns and none is sent when nothing
+  changed. The form carries the version it was rendered from, the save is
+  refused (returns False) when the row has a newer one, also when it is
+  written by someone else between this check and the UPDATE.
+  '''
+  version = request.form.get('version', type=int)
+  if version is None:
+    abort(400)
+  if version != entity.version:
+    return False
+  for name, value in values.items():
+    current = getattr(entity, name)
+    # an empty field matches a missing value
+    if value != current and (value or current):
+      setattr(entity, name, value)
+  try:
+    # UPDATE ... SET <changed>, version = version + 1 WHERE id = ? AND version = ?
+    db.session.commit()
+  except StaleDataError:
+    db.session.rollback()
+    return False
+  return True
+
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
@@ -304,13 +384,17 @@ def edit_artist_submission(artist_id):
   artist = Artist.query.get(artist_id)
 
   if artist:
-    setattr(artist, 'name', request.form.get('name'))
-    setattr(artist, 'genres', request.form.get('genres'))
-    setattr(artist, 'city', request.form.get('city'))
-    setattr(artist, 'state', request.form.get('state'))
-    setattr(artist, 'phone', request.form.get('phone'))
-    setattr(artist, 'facebook_link', request.form.get('facebook_link'))
-    db.session.commit()
+    values = {
+      'name': request.form.get('name'),
+      'genres': request.form.getlist('genres'),
+      'city': request.form.get('city'),
+      'state': request.form.get('state'),
+      'phone': request.form.get('phone'),
+      'facebook_link': request.form.get('facebook_link')
+    }
+    if not save_changes(artist, values):
+      flash('Artist ' + artist.name + ' was changed by someone else while you edited it. Your changes were not saved, this is the current version.')
+      return redirect(url_for('edit_artist', artist_id=artist_id))
     return redirect(url_for('show_artist', artist_id=artist_id))
   return render_template('errors/404.html')
 
@@ -335,14 +419,18 @@ def edit_venue_submission(venue_id):
   venue = Venue.query.get(venue_id)
 
   if venue:
-    setattr(venue, 'name', request.form.get('name'))
-    setattr(venue, 'genres', request.form.get('genres'))
-    setattr(venue, 'city', request.form.get('city'))
-    setattr(venue, 'state', request.form.get('state'))
-    setattr(venue, 'address', request.form.get('address'))
-    setattr(venue, 'phone', request.form.get('phone'))
-    setattr(venue, 'facebook_link', request.form.get('facebook_link'))
-    db.session.commit()
+    values = {
+      'name': request.form.get('name'),
+      'genres': request.form.getlist('genres'),
+      'city': request.form.get('city'),
+      'state': request.form.get('state'),
+      'address': request.form.get('address'),
+      'phone': request.form.get('phone'),
+      'facebook_link': request.form.get('facebook_link')
+    }
+    if not save_changes(venue, values):
+      flash('Venue ' + venue.name + ' was changed by someone else while you edited it. Your changes were not saved, this is the current version.')
+      return redirect(url_for('edit_venue', venue_id=venue_id))
     return redirect(url_for('show_venue', venue_id=venue_id))
   return render_template('errors/404.html')
 
@@ -386,14 +474,17 @@ def shows():
   # displays list of shows at /shows
   data = []
   showList = Show.query.order_by(Show.start_time).all()
-  for show in showList:
+  # one formatter for the whole page instead of one filter call per show
+  start_times = date_format.format_datetimes([show.start_time for show in showList], 'full', app.config['DATETIME_LOCALE'])
+  for show, start_time in zip(showList, start_times):
     data.append({
       "venue_id": show.venue_id,
       "venue_name": show.venue.name,
       "artist_id": show.artist_id,
       "artist_name": show.artist.name,
       "artist_image_link": show.artist.image_link,
-      "start_time": show.start_time
+      "start_time": show.start_time,
+      "start_time_text": start_time
     })
   return render_template('pages/shows.html', shows=data)
 
@@ -407,15 +498,30 @@ def create_shows():
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   try:
-    venue_id = request.form['venue_id']
-    artist_id = request.form['artist_id']
-    start_time = request.form['start_time']
-    show = Show(venue_id = venue_id, artist_id = artist_id, start_time = start_time)
-    db.session.add(show)
-    db.session.commit()
-    # on successful db insert, flash success
-    flash('Show was successfully listed!')
-  except():
+    venue_id = int(request.form['venue_id'])
+    artist_id = int(request.form['artist_id'])
+    start_time = dateutil.parser.parse(request.form['start_time'])
+    duration = int(request.form.get('duration', DEFAULT_SHOW_MINUTES))
+  except (KeyError, ValueError, OverflowError):
+    flash('An error occurred. Show could not be listed.')
+    return render_template('pages/home.html')
+  if not 0 < duration <= MAX_SHOW_MINUTES:
+    flash('A show lasts between 1 and ' + str(MAX_SHOW_MINUTES) + ' minutes.')
+    return render_template('pages/home.html')
+
+  try:
+    show = Show(venue_id = venue_id, artist_id = artist_id, start_time = start_time, duration = duration)
+    # the indexed range query of availability.py, on postgres the
+    # exclusion constraints also catch a booking made at the same moment
+    conflict = find_conflict(venue_id, artist_id, show.start_time, show.end_time)
+    if conflict:
+      flash('Show could not be listed, ' + ('the venue' if conflict.venue_id == venue_id else 'the artist') + ' is booked from ' + str(conflict.start_time) + ' to ' + str(conflict.end_time) + '.')
+    else:
+      db.session.add(show)
+      db.session.commit()
+      # on successful db insert, flash success
+      flash('Show was successfully listed!')
+  except IntegrityError:
     db.session.rollback()
     # on unsuccessful db insert, flash an error instead.
     flash('An error occurred. Show could not be listed.')
@@ -423,6 +529,39 @@ def create_show_submission():
     db.session.close()
   return render_template('pages/home.html')
 
+@app.route('/venues/<int:venue_id>/availability')
+def venue_availability(venue_id):
+  '''
+  /venues/<id>/availability?start=2020-06-01&end=2020-06-08&duration=90
+  lists the free slots of the venue between start (default now) and end
+  (default a week later), only the slots of at least duration minutes
+  '''
+  try:
+    if 'start' in request.args:
+      start = dateutil.parser.parse(request.args['start'])
+    else:
+      start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    if 'end' in request.args:
+      end = dateutil.parser.parse(request.args['end'])
+    else:
+      end = start + timedelta(days=7)
+    min_length = timedelta(minutes=int(request.args.get('duration', 0)))
+  except (ValueError, OverflowError):
+    return jsonify({'success': False, 'error': 400, 'message': 'start and end must be dates, duration minutes'}), 400
+  if not start < end <= start + MAX_RANGE:
+    return jsonify({'success': False, 'error': 400, 'message': 'end must be after start and at most ' + str(MAX_RANGE.days) + ' days later'}), 400
+  if db.session.query(Venue.id).filter_by(id=venue_id).scalar() is None:
+    return jsonify({'success': False, 'error': 404, 'message': 'venue not found'}), 404
+
+  slots = free_slots(venue_id, start, end, min_length)
+  return jsonify({
+    'success': True,
+    'venue_id': venue_id,
+    'start': start.isoformat(),
+    'end': end.isoformat(),
+    'free_slots': [{'start': slot_start.isoformat(), 'end': slot_end.isoformat()} for slot_start, slot_end in slots]
+  })
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -432,15 +571,8 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# JSON lines in LOG_FILE (config.py), written by a background thread
+setup_logging(app)
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from models import db, Show, MAX_SHOW_MINUTES
+
+MAX_SHOW_LENGTH = timedelta(minutes=MAX_SHOW_MINUTES)
+# the longest date range /venues/<id>/availability answers for
+MAX_RANGE = timedelta(days=92)
+
+
+def overlapping(column, id, start, end):
+  '''
+  overlapping(column, id, start, end)
+      returns the criterion for the shows of a venue (column=Show.venue_id) or
+      an artist (column=Show.artist_id) that overlap [start, end).
+
+      No show is longer than MAX_SHOW_LENGTH, so bounding start_time from
+      both sides keeps the query a short range scan of the
+      (venue_id/artist_id, start_time) index, however many shows there
+      were before.
+  '''
+  return db.and_(
+    column == id,
+    Show.start_time < end,
+    Show.start_time > start - MAX_SHOW_LENGTH,
+    Show.end_time > start)
+
+def find_conflict(venue_id, artist_id, start, end):
+  '''
+  find_conflict(venue_id, artist_id, start, end)
+      returns a show that already books the venue or the artist during
+      [start, end), or None
+  '''
+  return Show.query.filter(overlapping(Show.venue_id, venue_id, start, end)).first() or \
+    Show.query.filter(overlapping(Show.artist_id, artist_id, start, end)).first()
+
+def free_slots(venue_id, start, end, min_length=timedelta(0)):
+  '''
+  free_slots(venue_id, start, end, min_length)
+      returns the (start, end) intervals within [start, end) in which the
+      venue has no show, leaving out the ones shorter than min_length
+  '''
+  booked = db.session.query(Show.start_time, Show.end_time) \
+    .filter(overlapping(Show.venue_id, venue_id, start, end)) \
+    .order_by(Show.start_time)
+  slots = []
+  free_from = start
+  for show_start, show_end in booked:
+    if show_start > free_from:
+      slots.append((free_from, show_start))
+    free_from = max(free_from, show_end)
+  if free_from < end:
+    slots.append((free_from, end))
+  return [slot for slot in slots if slot[1] - slot[0] >= min_length]
@@ -6,6 +6,12 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # Enable debug mode.
 DEBUG = True
 
+# Request and error log, see fsnd_shared.request_logging for the other LOG_ settings
+LOG_FILE = 'error.log'
+
+# Locale of the dates shown by the datetime template filter
+DATETIME_LOCALE = 'en_US'
+
 # Connect to the database
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = 'postgres://c15502@localhost:5432/fyyur'
@@ -0,0 +1,39 @@
+from datetime import datetime
+from functools import lru_cache
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+# the short names the templates use, anything else is a Babel pattern
+PATTERNS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=64)
+def get_formatter(format, locale):
+  '''
+  get_formatter(format, locale)
+      returns a function formatting one datetime. babel.dates.format_datetime
+      parses the locale and the pattern on every call, here they are parsed
+      once per (format, locale) pair.
+  '''
+  pattern = parse_pattern(PATTERNS.get(format, format))
+  locale = Locale.parse(locale)
+
+  def formatter(value):
+    if not isinstance(value, datetime):
+      value = dateutil.parser.parse(value)
+    return pattern.apply(value, locale)
+  return formatter
+
+def format_datetime(value, format='medium', locale='en_US'):
+  return get_formatter(format, locale)(value)
+
+def format_datetimes(values, format='medium', locale='en_US'):
+  '''
+  format_datetimes(values, format, locale)
+      formats a whole list with one formatter, for pages listing many shows
+  '''
+  formatter = get_formatter(format, locale)
+  return [formatter(value) for value in values]
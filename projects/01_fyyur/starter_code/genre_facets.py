@@ -0,0 +1,122 @@
+import threading
+import time
+from sqlalchemy import event, func, distinct
+from sqlalchemy.orm import object_session
+
+from fsnd_shared.db_routing import RoutingSession
+from fsnd_shared.settings import get_setting
+from models import db, Venue, Artist, GENRE_TABLES
+
+# ----------------------------------------------------------------------------#
+# Settings
+# ----------------------------------------------------------------------------#
+# read with fsnd_shared.settings.get_setting
+DEFAULTS = {
+    # seconds a genre -> count summary is reused, writes in this process
+    # clear it right away
+    'GENRE_FACET_TTL': 60.0
+}
+
+
+def uses_arrays():
+    return db.engine.dialect.name == 'postgresql'
+
+
+# ----------------------------------------------------------------------------#
+# Filters
+# ----------------------------------------------------------------------------#
+def genre_filter(model, genres):
+    '''
+    genre_filter(model, genres)
+        returns the criterion for venues or artists listing all of the
+        genres. On postgres it is `genres @> ARRAY[...]`, answered from
+        the GIN index, elsewhere one lookup per genre in the normalized
+        genre table.
+    '''
+    if uses_arrays():
+        return model.genres.contains(list(genres))
+    table, key = GENRE_TABLES[model]
+    return db.and_(*[
+        model.id.in_(db.select([key]).where(table.c.genre == genre))
+        for genre in genres])
+
+
+# ----------------------------------------------------------------------------#
+# Facets
+# ----------------------------------------------------------------------------#
+def count_genres(model):
+    '''
+    count_genres(model)
+        returns (genre, number of venues or artists) pairs, most common
+        genre first
+    '''
+    if uses_arrays():
+        rows = db.session.query(
+            model.id.label('id'),
+            func.unnest(model.genres).label('genre')).subquery()
+        genre, id = rows.c.genre, rows.c.id
+    else:
+        table, key = GENRE_TABLES[model]
+        genre, id = table.c.genre, key
+    count = func.count(distinct(id))
+    return db.session.query(genre, count) \
+        .group_by(genre).order_by(count.desc(), genre).all()
+
+
+class FacetCache:
+    '''
+    FacetCache
+    keeps the genre counts per model for GENRE_FACET_TTL seconds, so the
+    listing pages do not aggregate the whole table on every request
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, model, ttl):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(model)
+        if entry is not None and now - entry[0] < ttl:
+            return entry[1]
+        counts = count_genres(model)
+        with self.lock:
+            self.entries[model] = (now, counts)
+        return counts
+
+    def clear(self, model):
+        with self.lock:
+            self.entries.pop(model, None)
+
+
+facet_cache = FacetCache()
+
+
+def genre_counts(app, model):
+    return facet_cache.get(model, get_setting(app, 'GENRE_FACET_TTL', DEFAULTS))
+
+
+def mark_changed(session, model):
+    '''
+    mark_changed(session, model)
+        clears the counts of model once the session commits. The mapper
+        events below do it for ORM writes, bulk deletes call it themselves.
+    '''
+    session.info.setdefault('genre_changes', set()).add(model)
+
+
+def remember_change(mapper, connection, target):
+    mark_changed(object_session(target), mapper.class_)
+
+
+def clear_counts(session):
+    # once committed, so no request caches counts from before the write
+    for model in session.info.pop('genre_changes', ()):
+        facet_cache.clear(model)
+
+
+for model in (Venue, Artist):
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, name, remember_change)
+event.listen(RoutingSession, 'after_commit', clear_counts)
@@ -0,0 +1,128 @@
+from datetime import datetime
+from sqlalchemy import event, func, case
+
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats, LeaderboardState
+
+# model -> (stats table, its key column, the Show column pointing at it)
+STATS = {
+  Venue: (VenueStats, VenueStats.c.venue_id, 'venue_id'),
+  Artist: (ArtistStats, ArtistStats.c.artist_id, 'artist_id')
+}
+
+# counted_at of a database that was never rebuilt, every show starts after it
+NEVER_COUNTED = datetime(1970, 1, 1)
+
+def counted_at(connection):
+  '''
+  Returns the time of the last rebuild. upcoming_shows holds the shows
+  starting after it, which keeps the stored counts independent of the
+  clock: trending() subtracts the shows that started since.
+  '''
+  return connection.execute(db.select([LeaderboardState.c.counted_at])).scalar() or NEVER_COUNTED
+
+#----------------------------------------------------------------------------#
+# Incremental updates.
+#----------------------------------------------------------------------------#
+
+def count_show(connection, show, step):
+  '''
+  Adds step (1 or -1) to the counts of the venue and the artist of a show,
+  in the flush that inserts or deletes it. A show that started before the
+  last rebuild only counts in total_shows.
+  '''
+  upcoming = step if show.start_time > counted_at(connection) else 0
+  for table, key, column in STATS.values():
+    id = getattr(show, column)
+    updated = connection.execute(table.update().where(key == id).values(
+      upcoming_shows=table.c.upcoming_shows + upcoming,
+      total_shows=table.c.total_shows + step))
+    if updated.rowcount == 0 and step > 0:
+      connection.execute(table.insert().values(
+        {key.name: id, 'upcoming_shows': upcoming, 'total_shows': step}))
+
+def show_inserted(mapper, connection, target):
+  count_show(connection, target, 1)
+
+def show_deleted(mapper, connection, target):
+  count_show(connection, target, -1)
+
+def owner_deleted(mapper, connection, target):
+  table, key, column = STATS[mapper.class_]
+  connection.execute(table.delete().where(key == target.id))
+
+event.listen(Show, 'after_insert', show_inserted)
+event.listen(Show, 'after_delete', show_deleted)
+for model in STATS:
+  event.listen(model, 'after_delete', owner_deleted)
+
+def uncount_shows(criterion):
+  '''
+  Subtracts the shows matching criterion from the counts of their venues
+  and artists, for deletes that bypass the ORM (bulk deletes and ON
+  DELETE CASCADE). It is one UPDATE per table and has to run before the
+  shows are deleted, in the same transaction.
+  '''
+  since = counted_at(db.session)
+  for table, key, column in STATS.values():
+    show_column = getattr(Show, column)
+    matching = db.and_(show_column == key, criterion)
+    db.session.execute(table.update().where(
+      key.in_(db.select([show_column]).where(criterion))
+    ).values(
+      upcoming_shows=table.c.upcoming_shows - db.select([func.count()]).where(db.and_(matching, Show.start_time > since)).as_scalar(),
+      total_shows=table.c.total_shows - db.select([func.count()]).where(matching).as_scalar()))
+
+#----------------------------------------------------------------------------#
+# Full rebuild.
+#----------------------------------------------------------------------------#
+
+def rebuild():
+  '''
+  Recounts every venue and artist from Show in one transaction and moves
+  counted_at to now. The counts are right without it, but trending()
+  subtracts every show that started since the last rebuild, so run it
+  regularly, e.g. `flask rebuild-leaderboard` daily from cron.
+  '''
+  now = datetime.now()
+  for model, (table, key, column) in STATS.items():
+    show_column = getattr(Show, column)
+    counts = db.session.query(
+      model.id,
+      func.coalesce(func.sum(case([(Show.start_time > now, 1)], else_=0)), 0),
+      func.count(Show.id)
+    ).outerjoin(Show, show_column == model.id).group_by(model.id)
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+      [key.name, 'upcoming_shows', 'total_shows'], counts.statement))
+  if db.session.execute(LeaderboardState.update().values(counted_at=now)).rowcount == 0:
+    db.session.execute(LeaderboardState.insert().values(id=1, counted_at=now))
+  db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Home page.
+#----------------------------------------------------------------------------#
+
+def trending(model, limit=5):
+  '''
+  Returns (id, name, upcoming_shows) rows of the venues or artists with the
+  most upcoming shows. The stored counts still include the shows that
+  started since the last rebuild; those are counted from the start_time
+  index and subtracted, so the numbers are exact as of now without
+  aggregating all of Show.
+  '''
+  table, key, column = STATS[model]
+  show_column = getattr(Show, column)
+  started = db.session.query(show_column.label('id'), func.count().label('shows')) \
+    .filter(Show.start_time > counted_at(db.session), Show.start_time <= datetime.now()) \
+    .group_by(show_column).subquery()
+  upcoming = table.c.upcoming_shows - func.coalesce(started.c.shows, 0)
+  return db.session.query(model.id, model.name, upcoming.label('upcoming_shows')) \
+    .join(table, key == model.id) \
+    .outerjoin(started, started.c.id == model.id) \
+    .filter(table.c.upcoming_shows > 0, upcoming > 0) \
+    .order_by(upcoming.desc(), model.id) \
+    .limit(limit).all()
+
+def recently_listed(model, limit=5):
+  return db.session.query(model.id, model.name) \
+    .order_by(model.id.desc()).limit(limit).all()
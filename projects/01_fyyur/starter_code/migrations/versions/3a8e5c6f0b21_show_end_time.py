@@ -0,0 +1,42 @@
+"""show duration, end_time and overlap constraints
+
+Revision ID: 3a8e5c6f0b21
+Revises: 7c1f2b9d3e4a
+Create Date: 2026-10-19 21:48:37.905126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a8e5c6f0b21'
+down_revision = '7c1f2b9d3e4a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute('''UPDATE "Show" SET end_time = start_time + duration * interval '1 minute' ''')
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_Show_duration', 'Show', 'duration > 0 AND duration <= 1440')
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    # fails while overlapping shows exist, move or delete them first
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute('''ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_venue_overlap"
+        EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)''')
+    op.execute('''ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_artist_overlap"
+        EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)''')
+
+
+def downgrade():
+    op.drop_constraint('ex_Show_artist_overlap', 'Show')
+    op.drop_constraint('ex_Show_venue_overlap', 'Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.drop_constraint('ck_Show_duration', 'Show', type_='check')
+    op.drop_column('Show', 'end_time')
+    op.drop_column('Show', 'duration')
@@ -0,0 +1,46 @@
+"""GIN indexes on the genres arrays
+
+Revision ID: 7c1f2b9d3e4a
+Revises: 452e4da244ea
+Create Date: 2026-10-19 21:05:12.418733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1f2b9d3e4a'
+down_revision = '452e4da244ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # genres @> ARRAY['Jazz'] (/venues?genre=Jazz) reads these indexes
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+    # only filled on databases without arrays, see models.py
+    op.create_table('VenueGenre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre')
+    )
+    op.create_index(op.f('ix_VenueGenre_genre'), 'VenueGenre', ['genre'], unique=False)
+    op.create_table('ArtistGenre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre')
+    )
+    op.create_index(op.f('ix_ArtistGenre_genre'), 'ArtistGenre', ['genre'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ArtistGenre_genre'), table_name='ArtistGenre')
+    op.drop_table('ArtistGenre')
+    op.drop_index(op.f('ix_VenueGenre_genre'), table_name='VenueGenre')
+    op.drop_table('VenueGenre')
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
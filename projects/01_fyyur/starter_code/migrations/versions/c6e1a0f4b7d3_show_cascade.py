@@ -0,0 +1,33 @@
+"""cascade venue and artist deletes to their shows
+
+Revision ID: c6e1a0f4b7d3
+Revises: 9d4b7e2a1c58
+Create Date: 2026-10-19 23:12:45.180394
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1a0f4b7d3'
+down_revision = '9d4b7e2a1c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('Show_venue_id_fkey', 'Show', type_='foreignkey')
+    op.drop_constraint('Show_artist_id_fkey', 'Show', type_='foreignkey')
+    op.create_foreign_key('Show_venue_id_fkey', 'Show', 'Venue', ['venue_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'], ondelete='CASCADE')
+    # flask purge-shows walks the past shows by start_time
+    op.create_index(op.f('ix_Show_start_time'), 'Show', ['start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Show_start_time'), table_name='Show')
+    op.drop_constraint('Show_artist_id_fkey', 'Show', type_='foreignkey')
+    op.drop_constraint('Show_venue_id_fkey', 'Show', type_='foreignkey')
+    op.create_foreign_key('Show_venue_id_fkey', 'Show', 'Venue', ['venue_id'], ['id'])
+    op.create_foreign_key('Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'])
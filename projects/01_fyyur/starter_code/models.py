@@ -1,6 +1,22 @@
-from flask_sqlalchemy import SQLAlchemy
+import sqlite3
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, DDL
+from sqlalchemy.engine import Engine
 
-db = SQLAlchemy()
+from fsnd_shared.db_routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# genres are a postgres array (GIN indexed, see genre_facets.py), other
+# databases store them as JSON and keep a normalized copy in VenueGenre
+# and ArtistGenre for filtering
+Genres = db.ARRAY(db.String(120)).with_variant(db.JSON, 'sqlite')
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+  # sqlite ignores ON DELETE CASCADE unless it is turned on per connection
+  if isinstance(dbapi_connection, sqlite3.Connection):
+    dbapi_connection.execute('PRAGMA foreign_keys = ON')
 
 
 
@@ -8,6 +24,9 @@ db = SQLAlchemy()
 # Models
 #----------------------------------------------------------------------------#
 
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
@@ -21,9 +40,18 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(Genres)
     website = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='venue', lazy=True)
+    # the database deletes the shows of a deleted venue (ON DELETE CASCADE)
+    shows = db.relationship('Show', backref='venue', lazy=True, passive_deletes=True)
+
+    # bumped by every UPDATE, which only applies to the version it read
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (
+      db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     def __repr__(self):
       return f'<Venue {self.id} {self.name}>'
@@ -36,13 +64,21 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(Genres)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artist', lazy=True)
+    shows = db.relationship('Show', backref='artist', lazy=True, passive_deletes=True)
+
+    # bumped by every UPDATE, which only applies to the version it read
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (
+      db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     def __repr__(self):
       return f'<Artist {self.id} {self.name}>'
@@ -52,9 +88,109 @@ class Show(db.Model):
     __tablename__ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    # minutes, end_time is kept so overlaps can be found with range queries
+    duration = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES, server_default=str(DEFAULT_SHOW_MINUTES))
+    end_time = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+      # a show is at most MAX_SHOW_MINUTES long, so the shows overlapping
+      # a time are found by scanning at most that much of these indexes
+      db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+      db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+      db.CheckConstraint(f'duration > 0 AND duration <= {MAX_SHOW_MINUTES}', name='ck_Show_duration'),
+    )
+
+    def __init__(self, **kwargs):
+      super().__init__(**kwargs)
+      if self.duration is None:
+        self.duration = DEFAULT_SHOW_MINUTES
+      if self.end_time is None and self.start_time is not None:
+        self.end_time = self.start_time + timedelta(minutes=self.duration)
 
     def __repr__(self):
       return f'<Show {self.id} {self.start_time}>'
+
+# on postgres the database itself rejects a second booking of a venue or
+# an artist for an overlapping time, see availability.py for the check
+# that runs before the insert
+SHOW_EXCLUSIONS = '''
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_venue_overlap"
+  EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&);
+ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_artist_overlap"
+  EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&);
+'''
+
+event.listen(Show.__table__, 'after_create', DDL(SHOW_EXCLUSIONS).execute_if(dialect='postgresql'))
+
+
+#----------------------------------------------------------------------------#
+# Leaderboard, show counts kept up to date by leaderboard.py.
+#----------------------------------------------------------------------------#
+
+VenueStats = db.Table('VenueStats',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('upcoming_shows', db.Integer, nullable=False, default=0, index=True),
+    db.Column('total_shows', db.Integer, nullable=False, default=0))
+
+ArtistStats = db.Table('ArtistStats',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('upcoming_shows', db.Integer, nullable=False, default=0, index=True),
+    db.Column('total_shows', db.Integer, nullable=False, default=0))
+
+# one row, when the counts were last rebuilt. upcoming_shows counts the
+# shows that start after counted_at, not after now.
+LeaderboardState = db.Table('LeaderboardState',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('counted_at', db.DateTime, nullable=False))
+
+@event.listens_for(LeaderboardState, 'after_create')
+def insert_leaderboard_state(target, connection, **kw):
+  connection.execute(target.insert().values(id=1, counted_at=datetime.now()))
+
+
+#----------------------------------------------------------------------------#
+# Normalized genres, only filled on databases without arrays.
+#----------------------------------------------------------------------------#
+
+VenueGenre = db.Table('VenueGenre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre', db.String(120), primary_key=True, index=True))
+
+ArtistGenre = db.Table('ArtistGenre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre', db.String(120), primary_key=True, index=True))
+
+# model -> (genre table, its foreign key column)
+GENRE_TABLES = {
+  Venue: (VenueGenre, VenueGenre.c.venue_id),
+  Artist: (ArtistGenre, ArtistGenre.c.artist_id)
+}
+
+def write_genres(connection, model, id, genres):
+  table, key = GENRE_TABLES[model]
+  connection.execute(table.delete().where(key == id))
+  if genres:
+    connection.execute(table.insert(), [
+      {key.name: id, 'genre': genre} for genre in set(genres)])
+
+def sync_genres(mapper, connection, target):
+  '''
+  Rewrites the normalized genres of a venue or artist whose genres
+  changed, in the flush that writes it.
+  '''
+  if connection.dialect.name != 'postgresql' and \
+      inspect(target).attrs.genres.history.has_changes():
+    write_genres(connection, mapper.class_, target.id, target.genres)
+
+def drop_genres(mapper, connection, target):
+  if connection.dialect.name != 'postgresql':
+    write_genres(connection, mapper.class_, target.id, None)
+
+for model in GENRE_TABLES:
+  event.listen(model, 'after_insert', sync_genres)
+  event.listen(model, 'after_update', sync_genres)
+  event.listen(model, 'after_delete', drop_genres)
@@ -0,0 +1,158 @@
+'''
+Compares how many concurrent quiz requests the WSGI app (flaskr) and the
+ASGI app (flaskr_async) handle when every database round trip is slow.
+
+    proxy   a TCP proxy in front of postgres that delays every reply by
+            --delay-ms, to stand in for a busy or distant database
+    load    sends --requests POST /quizzes requests, --concurrency at a
+            time, to each --url and prints throughput and latencies
+
+Run it with the packages of requirements-async.txt, e.g.:
+
+    python bench_async.py proxy --listen localhost:6432 \\
+        --target localhost:5432 --delay-ms 20
+    DATABASE_URL=postgres://localhost:6432/trivia \\
+        gunicorn -w 1 --threads 8 -b :5000 "flaskr:create_app()"
+    ASYNC_DATABASE_URL=postgresql+asyncpg://localhost:6432/trivia \\
+        DB_POOL_SIZE=50 hypercorn -b :8000 "flaskr_async:create_app()"
+    python bench_async.py load --url wsgi=http://localhost:5000 \\
+        --url asgi=http://localhost:8000 --concurrency 200
+'''
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+
+# ----------------------------------------------------------------------------#
+# Latency proxy
+# ----------------------------------------------------------------------------#
+def split_address(address):
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+async def pipe(reader, writer, delay):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_proxy(listen, target, delay):
+    target_host, target_port = split_address(target)
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(
+            target_host, target_port)
+        # only the replies are delayed, one delay per round trip
+        await asyncio.gather(
+            pipe(client_reader, server_writer, 0),
+            pipe(server_reader, client_writer, delay))
+
+    host, port = split_address(listen)
+    server = await asyncio.start_server(handle, host, port)
+    print('proxying {} to {} with {:.0f} ms delay'.format(
+        listen, target, delay * 1000))
+    async with server:
+        await server.serve_forever()
+
+
+# ----------------------------------------------------------------------------#
+# Load
+# ----------------------------------------------------------------------------#
+async def run_load(url, requests, concurrency, timeout):
+    '''
+    Returns (seconds, latencies of the successful requests, errors).
+    '''
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits,
+                                 timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                body = {'quiz_category': {'id': 0},
+                        'previous_questions': random.sample(range(1, 30), 5)}
+                started = time.perf_counter()
+                try:
+                    response = await client.post('/quizzes', json=body)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - started, latencies, errors
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share / 100))]
+
+
+async def compare(urls, requests, concurrency, timeout):
+    print('{} requests, {} concurrent'.format(requests, concurrency))
+    print('{:<8} {:>10} {:>10} {:>10} {:>10} {:>7}'.format(
+        'app', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for name, url in urls:
+        seconds, latencies, errors = await run_load(
+            url, requests, concurrency, timeout)
+        print('{:<8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>7}'.format(
+            name, len(latencies) / seconds,
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 95) * 1000,
+            percentile(latencies, 99) * 1000, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    proxy = commands.add_parser('proxy', help='start the latency proxy')
+    proxy.add_argument('--listen', default='localhost:6432')
+    proxy.add_argument('--target', default='localhost:5432')
+    proxy.add_argument('--delay-ms', type=float, default=20,
+                       help='delay per reply (default 20)')
+
+    load = commands.add_parser('load', help='load the running apps')
+    load.add_argument('--url', action='append', required=True,
+                      help='name=url of an app, repeat for each app')
+    load.add_argument('--requests', type=int, default=2000,
+                      help='requests per app (default 2000)')
+    load.add_argument('--concurrency', type=int, default=100,
+                      help='requests in flight (default 100)')
+    load.add_argument('--timeout', type=float, default=30,
+                      help='seconds before a request fails (default 30)')
+    args = parser.parse_args()
+
+    if args.command == 'proxy':
+        asyncio.run(run_proxy(args.listen, args.target, args.delay_ms / 1000))
+    else:
+        urls = [url.partition('=')[::2] if '=' in url else (url, url)
+                for url in args.url]
+        asyncio.run(compare(urls, args.requests, args.concurrency,
+                            args.timeout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+Measures latency and peak memory of the list queries, loading full ORM
+objects versus selecting only the needed columns:
+
+    categories  Category.query.all() + format()['type']
+                versus db.session.query(Category.type)
+    questions   Question.query ... .all() + format()
+                versus a column-only query and row_dicts()
+
+Run it from this directory, e.g. `python bench_projection.py --rows 1000`.
+It uses an in-memory sqlite database unless --database is given.
+'''
+import argparse
+import timeit
+import tracemalloc
+
+from flask import Flask
+
+from fsnd_shared.fast_json import row_dicts
+from models import setup_db, db, Question, Category
+
+
+def seed(count):
+    Question.query.delete()
+    Category.query.delete()
+    db.session.bulk_insert_mappings(Category, [
+        {'type': 'Category {}'.format(i)} for i in range(count)])
+    db.session.bulk_insert_mappings(Question, [
+        {'question': 'Question {}?'.format(i), 'answer': 'Answer',
+         'category': str(i % 6 + 1), 'difficulty': i % 5 + 1}
+        for i in range(count)])
+    db.session.commit()
+
+
+def category_entities():
+    return [category.format()['type'] for category in Category.query.all()]
+
+
+def category_columns():
+    return [category_type for (category_type,)
+            in db.session.query(Category.type)]
+
+
+def question_entities():
+    return [question.format()
+            for question in Question.query.order_by(Question.id).all()]
+
+
+def question_columns():
+    return row_dicts(db.session.query(
+        Question.id, Question.question, Question.answer, Question.category,
+        Question.difficulty).order_by(Question.id))
+
+
+def measure(case, number):
+    '''
+    Returns the best time per call in ms and the peak memory of one call
+    in KiB. The session is cleared first, as it is for every request.
+    '''
+    db.session.remove()
+    case()
+    best = min(timeit.repeat(
+        lambda: (case(), db.session.remove()), number=number, repeat=5))
+    db.session.remove()
+    tracemalloc.start()
+    case()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best / number * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='rows to seed per table (default 1000)')
+    parser.add_argument('--number', type=int, default=20,
+                        help='calls per timing run (default 20)')
+    parser.add_argument('--database', default='sqlite://',
+                        help='database url (default in-memory sqlite)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    setup_db(app, args.database)
+    with app.app_context():
+        seed(args.rows)
+        print('{} rows, best of 5 runs of {} calls'.format(
+            args.rows, args.number))
+        for name, case in [('categories entities', category_entities),
+                           ('categories columns', category_columns),
+                           ('questions entities', question_entities),
+                           ('questions columns', question_columns)]:
+            latency, peak = measure(case, args.number)
+            print('{:<20} {:8.3f} ms {:10.1f} KiB peak'.format(
+                name, latency, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
+from fsnd_shared.fast_json import json_response, row_dicts
+from fsnd_shared.request_logging import setup_logging
 
 QUESTIONS_PER_PAGE = 10
 
@@ -12,6 +14,7 @@ QUESTIONS_PER_PAGE = 10
 def create_app(test_config=None):
 
     app = Flask(__name__)
+    setup_logging(app)
     setup_db(app)
 
     '''
@@ -43,6 +46,13 @@ def create_app(test_config=None):
 
         return current_questions
 
+    def get_category_types():
+        '''
+        Reads only the type column, no Category objects are loaded.
+        '''
+        return [category_type for (category_type,) in
+                db.session.query(Category.type).order_by(Category.id)]
+
     # ----------------------------------------------------------------------------#
     # API Endpoints
     # ----------------------------------------------------------------------------#
@@ -53,13 +63,11 @@ def create_app(test_config=None):
     '''
     @app.route('/categories', methods=['GET'])
     def get_categories():
-        categories = Category.query.all()
+        formatted_categories = get_category_types()
 
-        if not categories:
+        if not formatted_categories:
             abort(404)
 
-        formatted_categories = [category.format()['type']
-                                for category in categories]
         return jsonify({
             'success': True,
             'categories': formatted_categories
@@ -80,20 +88,30 @@ def create_app(test_config=None):
     '''
     @app.route('/questions', methods=['GET'])
     def get_questions():
-        questions = Question.query.order_by(Question.id).all()
-        paginated_questions = paginate_questions(request, questions)
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+
+        # only the current page is read, as plain rows with the
+        # question.format() fields
+        query = db.session.query(Question.id, Question.question,
+                                 Question.answer, Question.category,
+                                 Question.difficulty)
+        total_questions = query.count()
+        paginated_questions = row_dicts(
+            query.order_by(Question.id)
+            .offset((page - 1) * QUESTIONS_PER_PAGE)
+            .limit(QUESTIONS_PER_PAGE))
 
         if not paginated_questions:
             abort(404)
 
-        categories = Category.query.all()
-        formatted_categories = [category.format()['type']
-                                for category in categories]
+        formatted_categories = get_category_types()
 
-        return jsonify({
+        return json_response({
             'success': True,
             'questions': paginated_questions,
-            'total_questions': len(questions),
+            'total_questions': total_questions,
             'categories': formatted_categories,
             'current_category': None
         })
@@ -108,21 +126,20 @@ def create_app(test_config=None):
     '''
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question_by_id(question_id):
-        question = Question.query.filter(
-            Question.id == question_id).one_or_none()
-
-        if question is None:
-            abort(400)
-
         try:
-            question.delete()
-            return jsonify({
-                'success': True,
-                'deleted': question_id
-            })
+            deleted = Question.delete_by_id(question_id)
         except Exception:
+            db.session.rollback()
             abort(422)
 
+        if not deleted:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'deleted': question_id
+        })
+
     '''
     DONE:
     Create an endpoint to POST a new question,
@@ -0,0 +1,301 @@
+import os
+from quart import Quart, request, abort, jsonify
+from sqlalchemy import select, func, delete, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from fsnd_shared.db_config import DEFAULTS as DB_DEFAULTS
+from fsnd_shared.settings import get_setting
+from flaskr_async.tables import questions, categories, QUESTION_COLUMNS
+
+QUESTIONS_PER_PAGE = 10
+
+database_path = os.environ.get(
+    'ASYNC_DATABASE_URL', 'postgresql+asyncpg://localhost:5432/trivia')
+
+
+def engine_options(app, database_path):
+    '''
+    engine_options(app, database_path)
+        the pool settings of fsnd_shared.db_config for an asyncpg engine
+    '''
+    if not database_path.startswith('postgresql'):
+        return {}
+    options = {
+        'pool_pre_ping': get_setting(app, 'DB_POOL_PRE_PING', DB_DEFAULTS)}
+    connect_args = {}
+    statement_timeout = get_setting(app, 'DB_STATEMENT_TIMEOUT', DB_DEFAULTS)
+    if statement_timeout:
+        connect_args['server_settings'] = {
+            'statement_timeout': str(statement_timeout)}
+    if get_setting(app, 'DB_PGBOUNCER', DB_DEFAULTS):
+        # prepared statements do not survive PgBouncer's transaction pooling
+        options['poolclass'] = NullPool
+        connect_args['statement_cache_size'] = 0
+    else:
+        options.update({
+            'pool_size': get_setting(app, 'DB_POOL_SIZE', DB_DEFAULTS),
+            'max_overflow': get_setting(app, 'DB_MAX_OVERFLOW', DB_DEFAULTS),
+            'pool_timeout': get_setting(app, 'DB_POOL_TIMEOUT', DB_DEFAULTS),
+            'pool_recycle': get_setting(app, 'DB_POOL_RECYCLE', DB_DEFAULTS)
+        })
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def create_app(test_config=None, database_path=database_path):
+    '''
+    create_app(test_config, database_path)
+        the trivia API of flaskr on Quart, with the same endpoints and
+        responses. A request waiting on the database only holds a
+        coroutine, not a thread, so one process serves many more
+        concurrent requests, e.g. `hypercorn "flaskr_async:create_app()"`.
+    '''
+    app = Quart(__name__)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+
+    engine = create_async_engine(database_path,
+                                 **engine_options(app, database_path))
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    app.config['ASYNC_ENGINE'] = engine
+
+    @app.after_serving
+    async def dispose_engine():
+        await engine.dispose()
+
+    @app.after_request
+    async def after_request(response):
+        response.headers.add('Access-Control-Allow-Headers',
+                             'Content-Type, Authorization')
+        response.headers.add('Access-Control-Allow-Methods',
+                             'GET, PATCH, POST, DELETE, OPTIONS')
+        return response
+
+    # ----------------------------------------------------------------------------#
+    # Custom Functions
+    # ----------------------------------------------------------------------------#
+    async def get_category_types(session):
+        result = await session.execute(
+            select(categories.c.type).order_by(categories.c.id))
+        return result.scalars().all()
+
+    async def count_questions(session):
+        result = await session.execute(
+            select(func.count()).select_from(questions))
+        return result.scalar()
+
+    async def question_dicts(session, statement):
+        result = await session.execute(statement)
+        return [dict(row) for row in result.mappings()]
+
+    async def get_body():
+        body = await request.get_json()
+        if not isinstance(body, dict):
+            abort(400)
+        return body
+
+    # ----------------------------------------------------------------------------#
+    # API Endpoints
+    # ----------------------------------------------------------------------------#
+    @app.route('/categories', methods=['GET'])
+    async def get_categories():
+        async with Session() as session:
+            formatted_categories = await get_category_types(session)
+
+        if not formatted_categories:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'categories': formatted_categories
+        })
+
+    @app.route('/questions', methods=['GET'])
+    async def get_questions():
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+
+        async with Session() as session:
+            total_questions = await count_questions(session)
+            paginated_questions = await question_dicts(
+                session, select(*QUESTION_COLUMNS)
+                .order_by(questions.c.id)
+                .offset((page - 1) * QUESTIONS_PER_PAGE)
+                .limit(QUESTIONS_PER_PAGE))
+            if not paginated_questions:
+                abort(404)
+            formatted_categories = await get_category_types(session)
+
+        return jsonify({
+            'success': True,
+            'questions': paginated_questions,
+            'total_questions': total_questions,
+            'categories': formatted_categories,
+            'current_category': None
+        })
+
+    @app.route('/questions/<int:question_id>', methods=['DELETE'])
+    async def delete_question_by_id(question_id):
+        try:
+            async with Session.begin() as session:
+                result = await session.execute(
+                    delete(questions).where(questions.c.id == question_id))
+        except Exception:
+            abort(422)
+
+        if result.rowcount == 0:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'deleted': question_id
+        })
+
+    @app.route('/addQuestions', methods=['POST'])
+    async def add_question():
+        body = await get_body()
+        values = {name: body.get(name, None) for name in
+                  ('question', 'answer', 'category', 'difficulty')}
+        if None in values.values():
+            abort(400)
+
+        try:
+            async with Session.begin() as session:
+                await session.execute(insert(questions).values(
+                    question=values['question'], answer=values['answer'],
+                    category=str(values['category']),
+                    difficulty=int(values['difficulty'])))
+                total_questions = await count_questions(session)
+        except Exception:
+            abort(422)
+
+        return jsonify({
+            'success': True,
+            'questions': total_questions
+        })
+
+    @app.route('/search', methods=['POST'])
+    async def search_question():
+        body = await get_body()
+        search_term = body.get('searchTerm', None)
+
+        if search_term is None:
+            abort(422)
+
+        async with Session() as session:
+            formatted_questions = await question_dicts(
+                session, select(*QUESTION_COLUMNS)
+                .where(questions.c.question.ilike('%' + search_term + '%'))
+                .order_by(questions.c.id))
+            if not formatted_questions:
+                abort(404)
+            total_questions = await count_questions(session)
+
+        return jsonify({
+            'success': True,
+            'questions': formatted_questions,
+            'total_questions': total_questions,
+            'current_category': None
+        })
+
+    @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    async def get_questions_by_category_id(category_id):
+        page = request.args.get('page', 1, type=int)
+        in_category = questions.c.category == str(category_id)
+
+        async with Session() as session:
+            total_questions = (await session.execute(
+                select(func.count()).select_from(questions)
+                .where(in_category))).scalar()
+            if not total_questions:
+                abort(404)
+            paginated_questions = await question_dicts(
+                session, select(*QUESTION_COLUMNS).where(in_category)
+                .order_by(questions.c.id)
+                .offset(max(page - 1, 0) * QUESTIONS_PER_PAGE)
+                .limit(QUESTIONS_PER_PAGE))
+
+        return jsonify({
+            'success': True,
+            'questions': paginated_questions,
+            'total_questions': total_questions,
+            'current_category': category_id
+        })
+
+    @app.route('/quizzes', methods=['POST'])
+    async def quiz():
+        body = await get_body()
+        quiz_category = body.get('quiz_category', None)
+        previous_questions = body.get('previous_questions', None)
+
+        if quiz_category is None:
+            abort(400)
+
+        # the database picks the random question, only one row is read
+        statement = select(*QUESTION_COLUMNS)
+        if int(quiz_category['id']) != 0:
+            statement = statement.where(
+                questions.c.category == str(quiz_category['id']))
+        if previous_questions:
+            statement = statement.where(
+                questions.c.id.notin_(previous_questions))
+
+        async with Session() as session:
+            found = await question_dicts(
+                session, statement.order_by(func.random()).limit(1))
+
+        if not found:
+            return jsonify({
+                'success': False,
+                'question': None
+            })
+
+        return jsonify({
+            'success': True,
+            'question': found[0]
+        })
+
+    @app.errorhandler(400)
+    async def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "bad request"
+        }), 400
+
+    @app.errorhandler(404)
+    async def not_found(error):
+        return jsonify({
+            "success": False,
+            "error": 404,
+            "message": "resource not found"
+        }), 404
+
+    @app.errorhandler(405)
+    async def method_not_allowed(error):
+        return jsonify({
+            "success": False,
+            "error": 405,
+            "message": "method not allowed"
+        }), 405
+
+    @app.errorhandler(422)
+    async def unprocessable(error):
+        return jsonify({
+            "success": False,
+            "error": 422,
+            "message": "unprocessable"
+        }), 422
+
+    @app.errorhandler(500)
+    async def internal_server_error(error):
+        return jsonify({
+            "success": False,
+            "error": 500,
+            "message": "internal server error"
+        }), 500
+
+    return app
@@ -0,0 +1,25 @@
+from sqlalchemy import MetaData, Table, Column, String, Integer
+
+# The questions and categories tables of models.py as plain SQLAlchemy
+# tables. models.py is bound to Flask-SQLAlchemy 2.4 and SQLAlchemy 1.3,
+# which have no asyncio support, keep the two in step.
+metadata = MetaData()
+
+questions = Table(
+    'questions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('question', String),
+    Column('answer', String),
+    Column('category', String),
+    Column('difficulty', Integer)
+)
+
+categories = Table(
+    'categories', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('type', String)
+)
+
+# the fields of Question.format(), in order
+QUESTION_COLUMNS = (questions.c.id, questions.c.question, questions.c.answer,
+                    questions.c.category, questions.c.difficulty)
@@ -1,12 +1,14 @@
 import os
 from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+from fsnd_shared.db_config import engine_options, configure_engine
+from fsnd_shared.db_routing import RoutingSQLAlchemy
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    "DATABASE_URL", "postgres://{}/{}".format('localhost:5432', database_name))
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 
 def setup_db(app, database_path=database_path):
@@ -16,12 +18,40 @@ def setup_db(app, database_path=database_path):
     '''
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                          engine_options(app, database_path))
     db.app = app
     db.init_app(app)
+    configure_engine(app, db.engine)
     db.create_all()
 
 
-class Question(db.Model):
+class SingleStatementMixin:
+    '''
+    SingleStatementMixin
+    deletes a row by primary key with a single DELETE instead of loading
+    it into the session first, on postgres through DELETE ... RETURNING.
+    The same delete path as the capstone models; trivia never updates a
+    question, so there is no update_by_id.
+    '''
+
+    @classmethod
+    def delete_by_id(cls, id):
+        '''
+        Returns True if a row was deleted, False if no row has that id.
+        '''
+        table = cls.__table__
+        statement = table.delete().where(table.c.id == id)
+        if db.engine.dialect.name == 'postgresql':
+            deleted = db.session.execute(
+                statement.returning(table.c.id)).first() is not None
+        else:
+            deleted = db.session.execute(statement).rowcount > 0
+        db.session.commit()
+        return deleted
+
+
+class Question(SingleStatementMixin, db.Model):
     '''
     Question
     '''
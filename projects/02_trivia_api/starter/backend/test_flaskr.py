@@ -127,14 +127,14 @@ class TriviaTestCase(unittest.TestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], 'bad request')
 
-    def test_400_delete_question(self):
+    def test_404_delete_question(self):
         res = self.client().delete('/questions/{}'.format(1314))
         data = json.loads(res.data)
 
-        self.assertEqual(res.status_code, 400)
-        self.assertEqual(data['error'], 400)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['error'], 404)
         self.assertFalse(data['success'])
-        self.assertEqual(data['message'], 'bad request')
+        self.assertEqual(data['message'], 'resource not found')
 
     def test_search_question(self):
         search_term_valid = {
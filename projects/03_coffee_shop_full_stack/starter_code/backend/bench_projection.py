@@ -0,0 +1,78 @@
+'''
+Measures the GET /drinks query: Drink objects and drink.short() versus
+the column-only (id, title, recipe) rows the endpoint reads now.
+
+Run it from this directory with `python bench_projection.py --rows 1000`.
+'''
+import argparse
+import timeit
+import tracemalloc
+
+from flask import Flask
+
+from src.database.models import setup_db, db, Drink
+
+RECIPE = [{'name': 'milk', 'color': 'white', 'parts': 1},
+          {'name': 'coffee', 'color': 'brown', 'parts': 2}]
+
+
+def seed(count):
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(Drink, [
+        {'title': 'Drink {}'.format(i), 'recipe': RECIPE}
+        for i in range(count)])
+    db.session.commit()
+
+
+def short_entities():
+    return [drink.short() for drink in Drink.query.order_by(Drink.id).all()]
+
+
+def short_columns():
+    rows = db.session.query(Drink.id, Drink.title, Drink.recipe) \
+        .order_by(Drink.id)
+    return [{'id': id, 'title': title, 'recipe': Drink.short_recipe(recipe)}
+            for id, title, recipe in rows]
+
+
+def measure(case, number):
+    # a fresh session per call, like a request
+    db.session.remove()
+    case()
+    best = min(timeit.repeat(
+        lambda: (case(), db.session.remove()), number=number, repeat=5))
+    db.session.remove()
+    tracemalloc.start()
+    case()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best / number * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='drinks to seed (default 1000)')
+    parser.add_argument('--number', type=int, default=20,
+                        help='calls per timing run (default 20)')
+    parser.add_argument('--database', default='sqlite://',
+                        help='database url (default in-memory sqlite)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    setup_db(app, args.database)
+    with app.app_context():
+        seed(args.rows)
+        assert short_entities() == short_columns()
+        print('{} drinks, best of 5 runs of {} calls'.format(
+            args.rows, args.number))
+        for name, case in [('Drink.short()', short_entities),
+                           ('column rows', short_columns)]:
+            latency, peak = measure(case, args.number)
+            print('{:<15} {:8.3f} ms {:10.1f} KiB peak'.format(
+                name, latency, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""store drink recipe as native json
+
+Revision ID: 8b2e4f6a1c3d
+Revises: 3f1c2a9d7b10
+Create Date: 2020-07-12 18:21:07.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c3d'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+RECIPE_JSON = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+
+def upgrade():
+    # recipes were stored as json.dumps() text, so postgres can cast them
+    # in place
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('drink', 'recipe',
+                        existing_type=sa.String(length=180),
+                        type_=RECIPE_JSON,
+                        existing_nullable=False,
+                        postgresql_using='recipe::jsonb')
+        return
+
+    # sqlite's batch mode would CAST the text to JSON, which has numeric
+    # affinity, so copy the raw text into a new column instead
+    with op.batch_alter_table('drink') as batch_op:
+        batch_op.add_column(sa.Column('recipe_json', RECIPE_JSON,
+                                      nullable=True))
+    op.execute('UPDATE drink SET recipe_json = recipe')
+    with op.batch_alter_table('drink') as batch_op:
+        batch_op.drop_column('recipe')
+        batch_op.alter_column('recipe_json', new_column_name='recipe',
+                              existing_type=RECIPE_JSON, nullable=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('drink', 'recipe',
+                        existing_type=RECIPE_JSON,
+                        type_=sa.String(length=180),
+                        existing_nullable=False,
+                        postgresql_using='recipe::text')
+        return
+
+    with op.batch_alter_table('drink') as batch_op:
+        batch_op.add_column(sa.Column('recipe_text', sa.String(length=180),
+                                      nullable=True))
+    op.execute('UPDATE drink SET recipe_text = recipe')
+    with op.batch_alter_table('drink') as batch_op:
+        batch_op.drop_column('recipe')
+        batch_op.alter_column('recipe_text', new_column_name='recipe',
+                              existing_type=sa.String(length=180),
+                              nullable=False)
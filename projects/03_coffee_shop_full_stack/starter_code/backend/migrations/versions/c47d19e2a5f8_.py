@@ -0,0 +1,34 @@
+"""add menu version counter
+
+Revision ID: c47d19e2a5f8
+Revises: 8b2e4f6a1c3d
+Create Date: 2020-07-14 09:42:16.208551
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47d19e2a5f8'
+down_revision = '8b2e4f6a1c3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    menu_version = op.create_table('menu_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(menu_version, [
+        {'id': 1, 'version': 0, 'updated_at': datetime.utcnow()}
+    ])
+
+
+def downgrade():
+    op.drop_table('menu_version')
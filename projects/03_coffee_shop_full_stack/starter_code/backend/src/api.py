@@ -1,206 +1,309 @@
 import os
 from flask import Flask, request, jsonify, abort
+from flask.cli import with_appcontext
+from werkzeug.http import is_resource_modified
 from sqlalchemy import exc
 import json
+import click
 from flask_cors import CORS
+from flask_migrate import Migrate, stamp
+from fsnd_shared.fast_json import json_response, row_dicts
+from fsnd_shared.request_logging import setup_logging
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import (db, db_drop_and_create_all, setup_db,
+                              check_schema_version, Drink, MenuVersion)
 from .auth.auth import AuthError, requires_auth
+from .events.broadcaster import menu_events
 
-app = Flask(__name__)
-setup_db(app)
-CORS(app)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              os.pardir, 'migrations')
 
-# DONE initialize the datbase
-db_drop_and_create_all()
+migrate = Migrate()
 
 
 # ----------------------------------------------------------------------------#
-# API Endpoints
+# Database Initialization
 # ----------------------------------------------------------------------------#
-@app.route('/drinks', methods=['GET'])
-def get_drinks():
+@click.command('init-db')
+@click.confirmation_option(
+    prompt='This drops all existing drinks. Continue?')
+@with_appcontext
+def init_db_command():
     '''
-    DONE implement endpoint
-        GET /drinks
-            it should be a public endpoint
-            it should contain only the drink.short() data representation
-        returns status code 200 and json {"success": True, "drinks": drinks}
-        where drinks is the list of drinks
-            or appropriate status code indicating reason for failure
+    Drop and recreate all tables, then stamp the latest migration.
     '''
-    drinks = Drink.query.order_by(Drink.id).all()
-    if drinks is None:
-        abort(404)
+    db_drop_and_create_all()
+    stamp(directory=MIGRATIONS_DIR)
+    click.echo('Initialized the database.')
 
-    formatted_drinks = [drink.short() for drink in drinks]
 
-    return jsonify({
-        'success': True,
-        'drinks': formatted_drinks
-    })
-
-
-@app.route('/drinks-detail',  methods=['GET'])
-@requires_auth('get:drinks-detail')
-def get_drinks_detail(payload):
+def create_app(config=None):
     '''
-    DONE implement endpoint
-        GET /drinks-detail
-            it should require the 'get:drinks-detail' permission
-            it should contain the drink.long() data representation
-        returns status code 200 and json {"success": True, "drinks": drinks}
-        where drinks is the list of drinks
-            or appropriate status code indicating reason for failure
-    '''
-    drinks = Drink.query.order_by(Drink.id).all()
-    if not drinks:
-        abort(404)
-
-    formatted_drinks = [drink.long() for drink in drinks]
-
-    return jsonify({
-        'success': True,
-        'drinks': formatted_drinks
-    })
-
-
-@app.route('/drinks',  methods=['POST'])
-@requires_auth('post:drinks')
-def create_drinks(payload):
+    create_app(config)
+        builds a new application, config is an optional mapping applied
+        before the extensions are bound (e.g. SQLALCHEMY_DATABASE_URI,
+        SCHEMA_CHECK)
+        nothing here touches the database, the schema check runs before
+        the first request
     '''
-    DONE implement endpoint
-        POST /drinks
-            it should create a new row in the drinks table
-            it should require the 'post:drinks' permission
-            it should contain the drink.long() data representation
-        returns status code 200 and json {"success": True, "drinks": drink}
-        where drink an array containing only the newly created drink
-            or appropriate status code indicating reason for failure
-    '''
-    body = request.get_json()
-
-    new_title = body.get('title', None)
-    new_recipe = body.get('recipe', None)
-
-    if new_title is None:
-        abort(400)
-    if new_recipe is None:
-        abort(400)
-
-    try:
-        new_drink = Drink(title=new_title, recipe=json.dumps(new_recipe))
-
-        new_drink.insert()
+    app = Flask(__name__)
+    app.config['SCHEMA_CHECK'] = True
+    if config is not None:
+        app.config.from_mapping(config)
+
+    setup_logging(app)
+    setup_db(app)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR)
+    CORS(app)
+    app.cli.add_command(init_db_command)
+
+    @app.before_first_request
+    def verify_schema():
+        '''
+        the schema is created and upgraded by `flask init-db` and
+        `flask db upgrade`, workers only check that it is current
+        '''
+        if app.config['SCHEMA_CHECK']:
+            check_schema_version()
+
+    # ----------------------------------------------------------------------------#
+    # Custom Functions
+    # ----------------------------------------------------------------------------#
+    def menu_response(representation, cache_control, load_drinks):
+        '''
+        menu_response(representation, cache_control, load_drinks)
+            answers a menu GET with an ETag and Last-Modified taken from
+            the MenuVersion row, load_drinks is only called (and the drink
+            table only read) when the client's copy is out of date,
+            otherwise the response is an empty 304
+        '''
+        version = MenuVersion.current()
+        etag = '{}-{}'.format(representation, version.version)
+        last_modified = version.updated_at.replace(microsecond=0)
+
+        if is_resource_modified(request.environ, etag=etag,
+                                last_modified=last_modified):
+            response = json_response({
+                'success': True,
+                'drinks': load_drinks()
+            })
+        else:
+            response = app.response_class(status=304)
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    # ----------------------------------------------------------------------------#
+    # API Endpoints
+    # ----------------------------------------------------------------------------#
+    @app.route('/drinks', methods=['GET'])
+    def get_drinks():
+        '''
+        DONE implement endpoint
+            GET /drinks
+                it should be a public endpoint
+                it should contain only the drink.short() data representation
+            returns status code 200 and json
+            {"success": True, "drinks": drinks}
+            where drinks is the list of drinks
+                or appropriate status code indicating reason for failure
+            returns status code 304 if the client's ETag or
+            Last-Modified still matches the menu version
+        '''
+        def load_drinks():
+            # the drink.short() fields, read as plain rows
+            rows = db.session.query(
+                Drink.id, Drink.title, Drink.recipe).order_by(Drink.id)
+
+            return [{'id': id, 'title': title,
+                     'recipe': Drink.short_recipe(recipe)}
+                    for id, title, recipe in rows]
+
+        return menu_response('drinks', 'no-cache', load_drinks)
+
+    @app.route('/drinks/stream', methods=['GET'])
+    def stream_drinks():
+        '''
+            GET /drinks/stream
+                it should be a public endpoint
+                it streams server-sent events for every menu change:
+                drink-created and drink-updated carry the drink.short()
+                data representation, drink-deleted carries {"id": id}
+                and reset asks a client that fell behind to refetch
+                GET /drinks
+            each open stream holds a worker, so serve it from gevent
+            workers (gunicorn -k gevent)
+        '''
+        subscription = menu_events.subscribe()
+        return app.response_class(
+            menu_events.stream(subscription),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+
+    @app.route('/drinks-detail',  methods=['GET'])
+    @requires_auth('get:drinks-detail')
+    def get_drinks_detail(payload):
+        '''
+        DONE implement endpoint
+            GET /drinks-detail
+                it should require the 'get:drinks-detail' permission
+                it should contain the drink.long() data representation
+            returns status code 200 and json
+            {"success": True, "drinks": drinks}
+            where drinks is the list of drinks
+                or appropriate status code indicating reason for failure
+            returns status code 304 if the client's ETag or
+            Last-Modified still matches the menu version
+        '''
+        def load_drinks():
+            # the drink.long() fields, read without loading Drink objects
+            drinks = row_dicts(db.session.query(
+                Drink.id, Drink.title, Drink.recipe).order_by(Drink.id))
+            if not drinks:
+                abort(404)
+
+            return drinks
+
+        return menu_response('drinks-detail', 'private, no-cache',
+                             load_drinks)
+
+    @app.route('/drinks',  methods=['POST'])
+    @requires_auth('post:drinks')
+    def create_drinks(payload):
+        '''
+        DONE implement endpoint
+            POST /drinks
+                it should create a new row in the drinks table
+                it should require the 'post:drinks' permission
+                it should contain the drink.long() data representation
+            returns status code 200 and json {"success": True, "drinks": drink}
+            where drink an array containing only the newly created drink
+                or appropriate status code indicating reason for failure
+        '''
+        body = request.get_json()
+
+        new_title = body.get('title', None)
+        new_recipe = body.get('recipe', None)
+
+        if new_title is None:
+            abort(400)
+        if new_recipe is None:
+            abort(400)
+
+        try:
+            new_drink = Drink(title=new_title, recipe=new_recipe)
+
+            new_drink.insert()
+            return jsonify({
+                'success': True,
+                'drinks': [Drink.long(new_drink)]
+            })
+        except Exception:
+            abort(422)
+
+    @app.route('/drinks/<int:drink_id>',  methods=['PATCH'])
+    @requires_auth('patch:drinks')
+    def update_drink(payload, drink_id):
+        '''
+        DONE implement endpoint
+            PATCH /drinks/<id>
+                where <id> is the existing model id
+                it should respond with a 404 error if <id> is not found
+                it should update the corresponding row for <id>
+                it should require the 'patch:drinks' permission
+                it should contain the drink.long() data representation
+            returns status code 200 and json {"success": True, "drinks": drink}
+            where drink an array containing only the updated drink
+                or appropriate status code indicating reason for failure
+        '''
+        body = request.get_json()
+
+        update_drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
+
+        if update_drink is None:
+            abort(400)
+
+        update_title = body.get('title', None)
+        update_recipe = body.get('recipe', None)
+
+        try:
+            if update_title is not None:
+                update_drink.title = update_title
+            if update_recipe is not None:
+                update_drink.recipe = update_recipe
+            update_drink.update()
+
+            return jsonify({
+                'success': True,
+                'drinks': [Drink.long(update_drink)]
+            })
+        except Exception:
+            abort(422)
+
+    @app.route('/drinks/<int:drink_id>',  methods=['DELETE'])
+    @requires_auth('delete:drinks')
+    def delete_drinks_by_id(payload, drink_id):
+        '''
+        DONE implement endpoint
+            DELETE /drinks/<id>
+                where <id> is the existing model id
+                it should respond with a 404 error if <id> is not found
+                it should delete the corresponding row for <id>
+                it should require the 'delete:drinks' permission
+            returns status code 200 and json {"success": True, "delete": id}
+            where id is the id of the deleted record
+                or appropriate status code indicating reason for failure
+        '''
+        delete_drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
+
+        if delete_drink is None:
+            abort(400)
+
+        try:
+            delete_drink.delete()
+            return jsonify({
+                'success': True,
+                'delete': drink_id
+            })
+        except Exception:
+            abort(422)
+
+    # Error Handling
+    @app.errorhandler(422)
+    def unprocessable(error):
         return jsonify({
-            'success': True,
-            'drinks': [Drink.long(new_drink)]
-        })
-    except Exception:
-        abort(422)
-
-
-@app.route('/drinks/<int:drink_id>',  methods=['PATCH'])
-@requires_auth('patch:drinks')
-def update_drink(payload, drink_id):
-    '''
-    DONE implement endpoint
-        PATCH /drinks/<id>
-            where <id> is the existing model id
-            it should respond with a 404 error if <id> is not found
-            it should update the corresponding row for <id>
-            it should require the 'patch:drinks' permission
-            it should contain the drink.long() data representation
-        returns status code 200 and json {"success": True, "drinks": drink}
-        where drink an array containing only the updated drink
-            or appropriate status code indicating reason for failure
-    '''
-    body = request.get_json()
-
-    update_drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
-
-    if update_drink is None:
-        abort(400)
-
-    update_title = body.get('title', None)
-    update_recipe = body.get('recipe', None)
-
-    try:
-        if update_title is not None:
-            update_drink.title = update_title
-        if update_recipe is not None:
-            update_drink.recipe = json.dumps(update_recipe)
-        update_drink.update()
+                        "success": False,
+                        "error": 422,
+                        "message": "unprocessable"
+                        }), 422
 
+    @app.errorhandler(404)
+    def ressource_not_found(error):
         return jsonify({
-            'success': True,
-            'drinks': [Drink.long(update_drink)]
-        })
-    except Exception:
-        abort(422)
+                        "success": False,
+                        "error": 404,
+                        "message": "resource not found"
+                        }), 404
 
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({
+                        "success": False,
+                        "error": 400,
+                        "message": "bad request"
+                        }), 400
 
-@app.route('/drinks/<int:drink_id>',  methods=['DELETE'])
-@requires_auth('delete:drinks')
-def delete_drinks_by_id(payload, drink_id):
-    '''
-    DONE implement endpoint
-        DELETE /drinks/<id>
-            where <id> is the existing model id
-            it should respond with a 404 error if <id> is not found
-            it should delete the corresponding row for <id>
-            it should require the 'delete:drinks' permission
-        returns status code 200 and json {"success": True, "delete": id}
-        where id is the id of the deleted record
-            or appropriate status code indicating reason for failure
-    '''
-    delete_drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
-
-    if delete_drink is None:
-        abort(400)
-
-    try:
-        delete_drink.delete()
+    @app.errorhandler(AuthError)
+    def authentification_failed(AuthError):
         return jsonify({
-            'success': True,
-            'delete': drink_id
-        })
-    except Exception:
-        abort(422)
-
-
-# Error Handling
-@app.errorhandler(422)
-def unprocessable(error):
-    return jsonify({
-                    "success": False,
-                    "error": 422,
-                    "message": "unprocessable"
-                    }), 422
-
-
-@app.errorhandler(404)
-def ressource_not_found(error):
-    return jsonify({
-                    "success": False,
-                    "error": 404,
-                    "message": "resource not found"
-                    }), 404
-
-
-@app.errorhandler(400)
-def bad_request(error):
-    return jsonify({
-                    "success": False,
-                    "error": 400,
-                    "message": "bad request"
-                    }), 400
-
-
-@app.errorhandler(AuthError)
-def authentification_failed(AuthError):
-    return jsonify({
-                    "success": False,
-                    "error": AuthError.status_code,
-                    "message": "authentification failed"
-                    }), 401
+                        "success": False,
+                        "error": AuthError.status_code,
+                        "message": "authentification failed"
+                        }), 401
+
+    return app
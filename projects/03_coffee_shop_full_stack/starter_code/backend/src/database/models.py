@@ -1,25 +1,41 @@
 import os
-from sqlalchemy import Column, String, Integer
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, JSON, exc
+from sqlalchemy.dialects.postgresql import JSONB
 import json
+from fsnd_shared.db_config import engine_options, configure_engine
+from fsnd_shared.db_routing import RoutingSQLAlchemy
+
+from ..events.broadcaster import menu_events
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir,
-                                                   database_filename))
+database_path = os.environ.get(
+    'DATABASE_URL',
+    "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
+
+# alembic revision the models below expect, keep in sync with the newest
+# file in ../../migrations/versions
+SCHEMA_REVISION = 'c47d19e2a5f8'
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 
-def setup_db(app):
+def setup_db(app, database_path=database_path):
     '''
     setup_db(app)
         binds a flask application and a SQLAlchemy service
+        a SQLALCHEMY_DATABASE_URI already set on the app takes precedence
+        over database_path, no connection is opened until first use
     '''
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", database_path)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    db.app = app
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        engine_options(app, app.config["SQLALCHEMY_DATABASE_URI"]))
     db.init_app(app)
+    with app.app_context():
+        configure_engine(app, db.engine)
 
 
 def db_drop_and_create_all():
@@ -32,6 +48,85 @@ def db_drop_and_create_all():
     '''
     db.drop_all()
     db.create_all()
+    db.session.add(MenuVersion(id=MenuVersion.ROW_ID))
+    db.session.commit()
+
+
+def get_schema_revision():
+    '''
+    get_schema_revision()
+        returns the alembic revision the database is stamped with
+        or None if the database has never been migrated
+    '''
+    try:
+        return db.session.execute(
+            'SELECT version_num FROM alembic_version').scalar()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        return None
+
+
+def check_schema_version():
+    '''
+    check_schema_version()
+        raises a RuntimeError if the database is not at SCHEMA_REVISION
+        it only reads the alembic_version row and never changes the schema,
+        so it is safe to run from every worker at startup
+    '''
+    revision = get_schema_revision()
+    if revision != SCHEMA_REVISION:
+        raise RuntimeError(
+            'database schema is at revision {} but {} is required, '
+            'run `flask db upgrade` (or `flask init-db` for a new '
+            'database)'.format(revision, SCHEMA_REVISION))
+
+
+class MenuVersion(db.Model):
+    '''
+    MenuVersion
+    a single row counter that is bumped in the same transaction as every
+    drink change, so the menu endpoints can answer conditional GETs with
+    a primary key lookup instead of reading the drink table
+    '''
+    __tablename__ = 'menu_version'
+
+    ROW_ID = 1
+    # updated_at of the menu before the row exists, fixed so the
+    # Last-Modified and ETag of an unseeded database do not change
+    UNSEEDED_AT = datetime(1970, 1, 1)
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    '''
+    current()
+        returns the menu version row, or an unsaved version 0 row if the
+        table has not been seeded yet (the migration and `flask init-db`
+        both seed it)
+    '''
+    @classmethod
+    def current(cls):
+        version = cls.query.get(cls.ROW_ID)
+        if version is None:
+            version = cls(id=cls.ROW_ID, version=0,
+                          updated_at=cls.UNSEEDED_AT)
+        return version
+
+    '''
+    bump()
+        increments the version inside the current transaction,
+        the caller is responsible for the commit
+    '''
+    @classmethod
+    def bump(cls):
+        now = datetime.utcnow()
+        updated = cls.query.filter(cls.id == cls.ROW_ID).update({
+            cls.version: cls.version + 1,
+            cls.updated_at: now
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(cls(id=cls.ROW_ID, version=1, updated_at=now))
 
 
 class Drink(db.Model):
@@ -43,29 +138,36 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients blob - stored as native json (jsonb on postgres)
+    # so the driver decodes it and it can be queried in SQL
     # the required datatype is [{'color': string,
     #                            'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSON().with_variant(JSONB(), 'postgresql'),
+                    nullable=False)
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        process_recipe = json.loads(self.recipe)
-        if isinstance(process_recipe, list):
-            short_recipe = [{'color': r['color'], 'parts': r['parts']}
-                            for r in process_recipe]
-        else:
-            short_recipe = [{'color': process_recipe['color'],
-                             'parts': process_recipe['parts']}]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': Drink.short_recipe(self.recipe)
         }
 
+    '''
+    short_recipe(recipe)
+        the colors and parts of a recipe, shared by short() and the
+        column-only menu query that never loads Drink objects
+    '''
+    @staticmethod
+    def short_recipe(recipe):
+        if isinstance(recipe, list):
+            return [{'color': r['color'], 'parts': r['parts']}
+                    for r in recipe]
+        return [{'color': recipe['color'], 'parts': recipe['parts']}]
+
     '''
     long()
         long form representation of the Drink model
@@ -74,7 +176,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
@@ -88,7 +190,9 @@ class Drink(db.Model):
     '''
     def insert(self):
         db.session.add(self)
+        MenuVersion.bump()
         db.session.commit()
+        menu_events.publish('drink-created', self.short())
 
     '''
     delete()
@@ -99,8 +203,11 @@ class Drink(db.Model):
             drink.delete()
     '''
     def delete(self):
+        drink_id = self.id
         db.session.delete(self)
+        MenuVersion.bump()
         db.session.commit()
+        menu_events.publish('drink-deleted', {'id': drink_id})
 
     '''
     update()
@@ -112,7 +219,9 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
+        MenuVersion.bump()
         db.session.commit()
+        menu_events.publish('drink-updated', self.short())
 
     def __repr__(self):
         return json.dumps(self.short())
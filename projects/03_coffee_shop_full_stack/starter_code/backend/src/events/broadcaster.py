@@ -0,0 +1,88 @@
+import json
+import queue
+import threading
+
+# pending messages kept per client before it is considered too slow
+CLIENT_QUEUE_SIZE = 64
+# seconds of silence after which a comment line is sent to keep
+# proxies and load balancers from closing the connection
+HEARTBEAT_SECONDS = 15
+
+
+def format_event(event, data):
+    '''
+    format_event(event, data)
+        encodes one server-sent event, data is serialized as json
+    '''
+    return 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data))
+
+
+class Subscription:
+    '''
+    Subscription
+    a connected client, holds a bounded queue of encoded events
+    '''
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class Broadcaster:
+    '''
+    Broadcaster
+    in-process fan-out of events to every subscribed client
+    publish() never blocks: a client whose queue is full is dropped and
+    told to reload instead of slowing down the writer
+    '''
+    def __init__(self, queue_size=CLIENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, event, data):
+        message = format_event(event, data)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        '''
+        stream(subscription, heartbeat)
+            generator of text/event-stream chunks for one client,
+            unsubscribes when the client disconnects or falls behind
+        '''
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.dropped:
+                try:
+                    yield subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+            # events were lost, the client has to refetch the menu
+            yield format_event('reset', {})
+        finally:
+            self.unsubscribe(subscription)
+
+
+# drink create/update/delete events, published by the Drink model
+menu_events = Broadcaster()
@@ -2,18 +2,28 @@ import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy.orm import joinedload
 import random
 
-from models import setup_db, Actor, Movie, db_drop_and_create_all
+from models import setup_db, db, Actor, Movie, db_drop_and_create_all
 from auth import AuthError, requires_auth
+from fsnd_shared.fast_json import json_response, row_dicts
+from fsnd_shared.request_logging import setup_logging
 from datetime import date
 
 RESULTS_PER_PAGE = 10
+MAX_RESULTS_PER_PAGE = 100
+MAX_BATCH_SIZE = 500
+
+# accepted fields and their types for bulk writes
+ACTOR_FIELDS = {'name': str, 'age': int, 'gender': str}
+MOVIE_FIELDS = {'title': str, 'release_date': date}
 
 
 def create_app(test_config=None):
 
     app = Flask(__name__)
+    setup_logging(app)
     setup_db(app)
     # db_drop_and_create_all()
 
@@ -36,15 +46,190 @@ def create_app(test_config=None):
     # ----------------------------------------------------------------------------#
     # Custom Functions
     # ----------------------------------------------------------------------------#
-    def paginate_results(request, selection):
-        page = request.args.get('page', 1, type=int)
-        start = (page - 1) * RESULTS_PER_PAGE
-        end = start + RESULTS_PER_PAGE
+    def get_int_arg(request, name):
+        value = request.args.get(name, None)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            abort(400)
+
+    def read_date(value):
+        if not isinstance(value, str):
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            return None
+
+    def parse_date(value):
+        parsed = read_date(value)
+        if parsed is None:
+            abort(400)
+        return parsed
+
+    def get_date_arg(request, name):
+        value = request.args.get(name, None)
+        if value is None:
+            return None
+        return parse_date(value)
+
+    def get_id_list(body, key):
+        ids = body.get(key, None) if isinstance(body, dict) else None
+        if not isinstance(ids, list) or not ids:
+            abort(400)
+        if len(ids) > MAX_BATCH_SIZE:
+            abort(400)
+        if not all(isinstance(i, int) and not isinstance(i, bool)
+                   for i in ids):
+            abort(400)
+        return ids
+
+    def get_batch(body, key):
+        items = body.get(key, None) if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            abort(400)
+        if len(items) > MAX_BATCH_SIZE:
+            abort(400)
+        return items
+
+    def is_id(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    def validate_batch(items, fields, partial=False):
+        '''
+        Validates every item of a bulk write before anything is written.
+        Returns the cleaned rows and a list of per-item errors, partial
+        items are updates that need an id and at least one field.
+        '''
+        rows = []
+        errors = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({'index': index,
+                               'message': 'expected an object'})
+                continue
+
+            row = {}
+            problems = []
+            if partial:
+                if not is_id(item.get('id', None)):
+                    problems.append('id must be an integer')
+                row['id'] = item.get('id', None)
+
+            for field, kind in fields.items():
+                value = item.get(field, None)
+                if value is None:
+                    if not partial:
+                        problems.append('{} is required'.format(field))
+                    continue
+                if kind is date:
+                    value = read_date(value)
+                    valid = value is not None
+                elif kind is int:
+                    valid = is_id(value)
+                else:
+                    valid = isinstance(value, kind)
+                if not valid:
+                    problems.append('{} is invalid'.format(field))
+                row[field] = value
+
+            if partial and len(row) == 1:
+                problems.append('nothing to update')
+            if problems:
+                errors.append({'index': index,
+                               'message': ', '.join(problems)})
+            rows.append(row)
+        return rows, errors
+
+    def batch_error(errors):
+        return jsonify({
+            'success': False,
+            'error': 400,
+            'message': 'bad request',
+            'errors': errors
+        }), 400
+
+    def create_batch(model, key, fields):
+        rows, errors = validate_batch(get_batch(request.get_json(), key),
+                                      fields)
+        if errors:
+            return batch_error(errors)
+
+        try:
+            ids = model.insert_many(rows)
+        except Exception:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify({
+            'success': True,
+            'results': [{'index': index, 'id': id, 'status': 201}
+                        for index, id in enumerate(ids)]
+        })
+
+    def update_batch(model, key, fields):
+        rows, errors = validate_batch(get_batch(request.get_json(), key),
+                                      fields, partial=True)
+        if errors:
+            return batch_error(errors)
+
+        try:
+            updated_ids = model.update_many(rows)
+        except Exception:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify({
+            'success': True,
+            'results': [{'index': index, 'id': row['id'],
+                         'status': 200 if row['id'] in updated_ids else 404}
+                        for index, row in enumerate(rows)]
+        })
+
+    def delete_batch(model, key):
+        ids = get_id_list(request.get_json(), key)
+
+        try:
+            deleted_ids = model.delete_many(ids)
+        except Exception:
+            db.session.rollback()
+            abort(422)
 
-        results = [result.format() for result in selection]
-        current_results = results[start:end]
+        return jsonify({
+            'success': True,
+            'results': [{'index': index, 'id': id,
+                         'status': 200 if id in deleted_ids else 404}
+                        for index, id in enumerate(ids)]
+        })
+
+    def paginate_results(request, query, model):
+        '''
+        Keyset pagination on the primary key, ?after=<id>&limit=<n>.
+        Only one page (plus one row to detect the next page) is read
+        from the database, returns the page and the cursor to pass as
+        `after` for the next page, or None on the last page.
+        The query selects columns only, the page is returned as plain
+        dicts without loading ORM objects.
+        '''
+        limit = get_int_arg(request, 'limit')
+        if limit is None:
+            limit = RESULTS_PER_PAGE
+        if limit < 1 or limit > MAX_RESULTS_PER_PAGE:
+            abort(400)
 
-        return current_results
+        after = get_int_arg(request, 'after')
+        if after is not None:
+            query = query.filter(model.id > after)
+
+        selection = row_dicts(query.order_by(model.id).limit(limit + 1))
+        current_results = selection[:limit]
+        next_cursor = None
+        if len(selection) > limit:
+            next_cursor = current_results[-1]['id']
+
+        return current_results, next_cursor
 
     # ----------------------------------------------------------------------------#
     # API Endpoints
@@ -52,69 +237,87 @@ def create_app(test_config=None):
     @app.route('/actors', methods=['GET'])
     @requires_auth('get:actors')
     def get_actors(payload):
-        actors = Actor.query.all()
-
-        if actors is None:
-            abort(404)
-
-        formatted_actors = [actor.format() for actor in actors]
-
-        return jsonify({
+        query = db.session.query(Actor.id, Actor.name, Actor.age,
+                                 Actor.gender)
+
+        min_age = get_int_arg(request, 'min_age')
+        if min_age is not None:
+            query = query.filter(Actor.age >= min_age)
+        max_age = get_int_arg(request, 'max_age')
+        if max_age is not None:
+            query = query.filter(Actor.age <= max_age)
+        gender = request.args.get('gender', None)
+        if gender is not None:
+            query = query.filter(Actor.gender == gender)
+
+        formatted_actors, next_cursor = paginate_results(
+            request, query, Actor)
+
+        return json_response({
             'success': True,
-            'actors': formatted_actors
+            'actors': formatted_actors,
+            'next': next_cursor
         })
 
     @app.route('/movies', methods=['GET'])
     @requires_auth('get:movies')
     def get_movies(payload):
-        movies = Movie.query.all()
-
-        if movies is None:
-            abort(404)
-
-        formatted_movies = [movie.format() for movie in movies]
-
-        return jsonify({
+        query = db.session.query(Movie.id, Movie.title, Movie.release_date)
+
+        title = request.args.get('title', None)
+        if title:
+            query = query.filter(Movie.title.startswith(title,
+                                                        autoescape=True))
+        released_after = get_date_arg(request, 'released_after')
+        if released_after is not None:
+            query = query.filter(Movie.release_date >= released_after)
+        released_before = get_date_arg(request, 'released_before')
+        if released_before is not None:
+            query = query.filter(Movie.release_date <= released_before)
+
+        formatted_movies, next_cursor = paginate_results(
+            request, query, Movie)
+
+        return json_response({
             'success': True,
-            'movies': formatted_movies
+            'movies': formatted_movies,
+            'next': next_cursor
         })
 
     @app.route('/actors/<int:actor_id>', methods=['DELETE'])
     @requires_auth('delete:actors')
     def delete_actor_by_id(payload, actor_id):
-        actor = Actor.query.filter(
-            Actor.id == actor_id).one_or_none()
-
-        if actor is None:
-            abort(400)
-
         try:
-            actor.delete()
-            return jsonify({
-                'success': True,
-                'deleted_actor': actor_id
-            })
+            deleted = Actor.delete_by_id(actor_id)
         except Exception:
+            db.session.rollback()
             abort(422)
 
+        if not deleted:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'deleted_actor': actor_id
+        })
+
     @app.route('/movies/<int:movie_id>', methods=['DELETE'])
     @requires_auth('delete:movies')
     def delete_movie_by_id(payload, movie_id):
-        movie = Movie.query.filter(
-            Movie.id == movie_id).one_or_none()
-
-        if movie is None:
-            abort(400)
-
         try:
-            movie.delete()
-            return jsonify({
-                'success': True,
-                'deleted_movie': movie_id
-            })
+            deleted = Movie.delete_by_id(movie_id)
         except Exception:
+            db.session.rollback()
             abort(422)
 
+        if not deleted:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'deleted_movie': movie_id
+        })
+
     @app.route('/actors', methods=["POST"])
     @requires_auth('create:actors')
     def add_actor(payload):
@@ -158,6 +361,7 @@ def create_app(test_config=None):
             abort(400)
         if new_release_date is None:
             abort(400)
+        new_release_date = parse_date(new_release_date)
 
         try:
             movie = Movie(
@@ -179,56 +383,163 @@ def create_app(test_config=None):
     def update_actor(payload, actor_id):
         body = request.get_json()
 
-        update_actor = Actor.query.filter(Actor.id == actor_id).one_or_none()
+        values = {}
+        for field in ('name', 'age', 'gender'):
+            if body.get(field, None) is not None:
+                values[field] = body[field]
 
-        if update_actor is None:
-            abort(400)
+        try:
+            actor = Actor.update_by_id(actor_id, values)
+        except Exception:
+            db.session.rollback()
+            abort(422)
+
+        if actor is None:
+            abort(404)
 
-        update_name = body.get('name', None)
-        update_age = body.get('age', None)
-        update_gender = body.get('gender', None)
+        return jsonify({
+            'success': True,
+            'update_actor': [Actor.format(actor)]
+        })
+
+    @app.route('/movies/<int:movie_id>',  methods=['PATCH'])
+    @requires_auth('patch:movies')
+    def update_movie(payload, movie_id):
+        body = request.get_json()
+
+        values = {}
+        if body.get('title', None) is not None:
+            values['title'] = body['title']
+        if body.get('release_date', None) is not None:
+            values['release_date'] = parse_date(body['release_date'])
 
         try:
-            if update_name is not None:
-                update_actor.title = update_name
-            if update_age is not None:
-                update_actor.age = update_age
-            if update_gender is not None:
-                update_actor.gender = update_gender
-            update_actor.update()
+            movie = Movie.update_by_id(movie_id, values)
+        except Exception:
+            db.session.rollback()
+            abort(422)
+
+        if movie is None:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'update_movie': [Movie.format(movie)]
+        })
+
+    # ----------------------------------------------------------------------------#
+    # Bulk Writes
+    # ----------------------------------------------------------------------------#
+    @app.route('/actors/bulk', methods=['POST'])
+    @requires_auth('create:actors')
+    def add_actors(payload):
+        return create_batch(Actor, 'actors', ACTOR_FIELDS)
+
+    @app.route('/actors/bulk', methods=['PATCH'])
+    @requires_auth('patch:actors')
+    def update_actors(payload):
+        return update_batch(Actor, 'actors', ACTOR_FIELDS)
+
+    @app.route('/actors/bulk', methods=['DELETE'])
+    @requires_auth('delete:actors')
+    def delete_actors(payload):
+        return delete_batch(Actor, 'actors')
+
+    @app.route('/movies/bulk', methods=['POST'])
+    @requires_auth('create:movies')
+    def add_movies(payload):
+        return create_batch(Movie, 'movies', MOVIE_FIELDS)
+
+    @app.route('/movies/bulk', methods=['PATCH'])
+    @requires_auth('patch:movies')
+    def update_movies(payload):
+        return update_batch(Movie, 'movies', MOVIE_FIELDS)
+
+    @app.route('/movies/bulk', methods=['DELETE'])
+    @requires_auth('delete:movies')
+    def delete_movies(payload):
+        return delete_batch(Movie, 'movies')
+
+    # ----------------------------------------------------------------------------#
+    # Casting
+    # ----------------------------------------------------------------------------#
+    @app.route('/movies/<int:movie_id>/actors', methods=['GET'])
+    @requires_auth('get:actors')
+    def get_movie_actors(payload, movie_id):
+        movie = (Movie.query.options(joinedload(Movie.actors))
+                            .filter(Movie.id == movie_id)
+                            .one_or_none())
+
+        if movie is None:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'movie': movie.format(),
+            'actors': [actor.format() for actor in movie.actors]
+        })
+
+    @app.route('/actors/<int:actor_id>/movies', methods=['GET'])
+    @requires_auth('get:movies')
+    def get_actor_movies(payload, actor_id):
+        actor = (Actor.query.options(joinedload(Actor.movies))
+                            .filter(Actor.id == actor_id)
+                            .one_or_none())
+
+        if actor is None:
+            abort(404)
+
+        return jsonify({
+            'success': True,
+            'actor': actor.format(),
+            'movies': [movie.format() for movie in actor.movies]
+        })
+
+    @app.route('/movies/<int:movie_id>/actors', methods=['POST'])
+    @requires_auth('patch:movies')
+    def assign_actors(payload, movie_id):
+        actor_ids = get_id_list(request.get_json(), 'actors')
+
+        movie = Movie.query.get(movie_id)
+        if movie is None:
+            abort(404)
+
+        known_ids = {actor_id for (actor_id,) in db.session.query(Actor.id)
+                     .filter(Actor.id.in_(actor_ids))}
+        if known_ids != set(actor_ids):
+            abort(422)
+
+        try:
+            assigned = movie.assign_actors(actor_ids)
 
             return jsonify({
                 'success': True,
-                'update_actor': [update_actor.format()]
+                'movie': movie_id,
+                'assigned': assigned
             })
         except Exception:
+            db.session.rollback()
             abort(422)
 
-    @app.route('/movies/<int:movie_id>',  methods=['PATCH'])
+    @app.route('/movies/<int:movie_id>/actors', methods=['DELETE'])
     @requires_auth('patch:movies')
-    def update_movie(payload, movie_id):
-        body = request.get_json()
-
-        update_movie = Movie.query.filter(Movie.id == movie_id).one_or_none()
+    def unassign_actors(payload, movie_id):
+        actor_ids = get_id_list(request.get_json(), 'actors')
 
-        if update_movie is None:
-            abort(400)
-
-        update_title = body.get('title', None)
-        update_release_date = body.get('release_date', None)
+        movie = Movie.query.get(movie_id)
+        if movie is None:
+            abort(404)
 
         try:
-            if update_title is not None:
-                update_movie.title = update_title
-            if update_release_date is not None:
-                update_movie.release_date = update_release_date
-            update_movie.update()
+            unassigned = movie.unassign_actors(actor_ids)
 
             return jsonify({
                 'success': True,
-                'update_movie': [update_movie.format()]
+                'movie': movie_id,
+                'unassigned': unassigned
             })
         except Exception:
+            db.session.rollback()
             abort(422)
 
     # ----------------------------------------------------------------------------#
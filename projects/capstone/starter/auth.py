@@ -91,6 +91,17 @@ def check_permissions(permission, payload):
     return True
 
 
+def get_jwks():
+    '''
+    get_jwks() method
+        fetches the public keys of the Auth0 tenant from
+        /.well-known/jwks.json
+        the test suite replaces it to verify locally signed tokens
+    '''
+    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+    return json.loads(jsonurl.read())
+
+
 def verify_decode_jwt(token):
     '''
     verify_decode_jwt(token) method
@@ -106,8 +117,7 @@ def verify_decode_jwt(token):
         !!NOTE urlopen has a common certificate error described here:
         https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
     '''
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    jwks = get_jwks()
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
     if 'kid' not in unverified_header:
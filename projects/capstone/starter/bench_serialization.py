@@ -0,0 +1,73 @@
+'''
+Compares the two ways of serializing a list of actors:
+
+    orm      Actor.query ... .all(), Actor.format() and flask.json.dumps,
+             which is what the list endpoints used to do
+    columns  a column-only query, row_dicts() and the fast_json encoder
+
+Run it from this directory, e.g. `python bench_serialization.py --rows 100`.
+It uses an in-memory sqlite database unless --database is given. Seeding
+deletes every actor of that database, so never point it at a real one.
+'''
+import argparse
+import timeit
+
+from flask import Flask, json
+
+from fsnd_shared import fast_json
+from models import setup_db, db, Actor
+
+
+def seed(count):
+    Actor.query.delete()
+    db.session.bulk_insert_mappings(Actor, [
+        {'name': 'Actor {}'.format(i), 'age': 20 + i % 50,
+         'gender': 'Female' if i % 2 else 'Male'}
+        for i in range(count)])
+    db.session.commit()
+
+
+def orm_page(rows):
+    actors = Actor.query.order_by(Actor.id).limit(rows).all()
+    return json.dumps([actor.format() for actor in actors])
+
+
+def column_page(rows, dumps):
+    query = db.session.query(Actor.id, Actor.name, Actor.age, Actor.gender)
+    return dumps(fast_json.row_dicts(query.order_by(Actor.id).limit(rows)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100,
+                        help='rows per page (default 100)')
+    parser.add_argument('--number', type=int, default=200,
+                        help='pages per timing run (default 200)')
+    parser.add_argument('--database', default='sqlite://',
+                        help='database url (default in-memory sqlite)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    setup_db(app, args.database)
+    with app.app_context():
+        seed(args.rows)
+        cases = [('orm + flask.json', lambda: orm_page(args.rows))]
+        for name, dumps in sorted(fast_json.BACKENDS.items()):
+            cases.append(('columns + {}'.format(name),
+                          lambda dumps=dumps: column_page(args.rows, dumps)))
+
+        print('{} rows per page, best of 5 runs of {} pages'.format(
+            args.rows, args.number))
+        baseline = None
+        for name, case in cases:
+            case()
+            best = min(timeit.repeat(case, number=args.number, repeat=5))
+            per_page = best / args.number * 1000
+            baseline = baseline or per_page
+            print('{:<20} {:8.3f} ms/page  {:5.2f}x'.format(
+                name, per_page, baseline / per_page))
+        db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import base64
+import os
+import time
+
+import pytest
+from Crypto.PublicKey import RSA
+from jose import jwt
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine.url import make_url
+
+# ----------------------------------------------------------------------------#
+# Test Settings
+# ----------------------------------------------------------------------------#
+# the tests never talk to Auth0: tokens are signed with a key generated
+# for the session and auth.get_jwks() is replaced to publish its public half
+TEST_AUTH0_DOMAIN = 'casting-agency.test'
+TEST_API_AUDIENCE = 'cast'
+TEST_KEY_ID = 'casting-agency-test-key'
+
+ROLE_PERMISSIONS = {
+    'casting_assistant': ['get:actors', 'get:movies'],
+    'casting_director': ['create:actors', 'delete:actors', 'get:actors',
+                         'get:movies', 'patch:actors', 'patch:movies'],
+    'executive_producer': ['create:actors', 'create:movies',
+                           'delete:actors', 'delete:movies', 'get:actors',
+                           'get:movies', 'patch:actors', 'patch:movies']
+}
+
+
+def worker_database_url(url):
+    '''
+    worker_database_url(url)
+        gives every pytest-xdist worker its own database, so the workers
+        never wait on each other's locks
+    '''
+    url = make_url(url)
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    if not worker or url.database in (None, '', ':memory:'):
+        return url
+    if url.get_backend_name() == 'sqlite':
+        root, ext = os.path.splitext(url.database)
+        url.database = '{}_{}{}'.format(root, worker, ext)
+    else:
+        url.database = '{}_{}'.format(url.database, worker)
+    return url
+
+
+def create_database(url):
+    '''
+    create_database(url)
+        creates the postgres database of a worker if it does not exist yet
+    '''
+    if url.get_backend_name() not in ('postgres', 'postgresql'):
+        return
+    maintenance_url = make_url(str(url))
+    maintenance_url.database = 'postgres'
+    engine = create_engine(maintenance_url, isolation_level='AUTOCOMMIT')
+    with engine.connect() as connection:
+        exists = connection.execute(
+            text('SELECT 1 FROM pg_database WHERE datname = :name'),
+            name=url.database).scalar()
+        if not exists:
+            connection.execute('CREATE DATABASE "{}"'.format(url.database))
+    engine.dispose()
+
+
+# the app reads its settings at import time, so point it at the test
+# database and the local issuer before anything imports it
+TEST_DATABASE_URL = worker_database_url(os.environ.get(
+    'TEST_DATABASE_URL',
+    "postgres://{}/{}".format('localhost:5432', 'cast_agency_test')))
+create_database(TEST_DATABASE_URL)
+os.environ['DATABASE_URL'] = str(TEST_DATABASE_URL)
+os.environ['AUTH0_DOMAIN'] = TEST_AUTH0_DOMAIN
+os.environ['API_AUDIENCE'] = TEST_API_AUDIENCE
+os.environ['ALGORITHMS'] = 'RS256'
+
+import auth  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, db_drop_and_create_all  # noqa: E402
+
+
+def b64_number(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+# ----------------------------------------------------------------------------#
+# Fixtures
+# ----------------------------------------------------------------------------#
+@pytest.fixture(scope='session')
+def app():
+    '''
+    Creates the app once and builds the schema once per session (and per
+    worker), tests only ever see it through a rolled back transaction.
+    '''
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            enable_sqlite_savepoints(db.engine)
+        db_drop_and_create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+
+def enable_sqlite_savepoints(engine):
+    '''
+    pysqlite starts transactions lazily and breaks SAVEPOINT, let
+    SQLAlchemy emit BEGIN itself instead
+    '''
+    @event.listens_for(engine, 'connect')
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(connection):
+        connection.execute('BEGIN')
+
+    # connections opened before the listeners were added keep pysqlite's
+    # behaviour
+    engine.dispose()
+
+
+@pytest.fixture
+def db_session(app):
+    '''
+    Runs a test inside a transaction that is rolled back afterwards. The
+    app's own commits and rollbacks only end a SAVEPOINT, which is
+    restarted right away, so nothing a test writes is ever committed.
+    '''
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        session = db.create_scoped_session(
+            options={'bind': connection, 'binds': {}})
+        session.begin_nested()
+
+        @event.listens_for(session, 'after_transaction_end')
+        def restart_savepoint(session, ended_transaction):
+            if ended_transaction.nested and \
+                    not ended_transaction._parent.nested:
+                session.expire_all()
+                session.begin_nested()
+
+        app_session = db.session
+        db.session = session
+        try:
+            yield session
+        finally:
+            db.session = app_session
+            event.remove(session, 'after_transaction_end', restart_savepoint)
+            session.rollback()
+            session.remove()
+            transaction.rollback()
+            connection.close()
+
+
+@pytest.fixture(scope='session')
+def tokens():
+    '''
+    Signs one RS256 token per role with a key generated for the session.
+    '''
+    key = RSA.generate(2048)
+    private_key = key.exportKey('PEM').decode('ascii')
+    jwks = {'keys': [{
+        'kty': 'RSA',
+        'kid': TEST_KEY_ID,
+        'use': 'sig',
+        'alg': 'RS256',
+        'n': b64_number(key.n),
+        'e': b64_number(key.e)
+    }]}
+
+    get_jwks = auth.get_jwks
+    auth.get_jwks = lambda: jwks
+
+    now = int(time.time())
+    role_tokens = {}
+    for role, permissions in ROLE_PERMISSIONS.items():
+        claims = {
+            'iss': 'https://{}/'.format(TEST_AUTH0_DOMAIN),
+            'sub': 'test|{}'.format(role),
+            'aud': TEST_API_AUDIENCE,
+            'iat': now,
+            'exp': now + 3600,
+            'permissions': permissions
+        }
+        role_tokens[role] = jwt.encode(claims, private_key,
+                                       algorithm='RS256',
+                                       headers={'kid': TEST_KEY_ID})
+    yield role_tokens
+    auth.get_jwks = get_jwks
@@ -1,8 +1,9 @@
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
-from app import app
+from app import create_app
 from models import db
 
+app = create_app()
 migrate = Migrate(app, db)
 manager = Manager(app)
 
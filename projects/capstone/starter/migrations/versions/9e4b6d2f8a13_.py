@@ -0,0 +1,33 @@
+"""index actor and movie list filters
+
+Revision ID: 9e4b6d2f8a13
+Revises: 5a8c0e3b7d21
+Create Date: 2020-07-18 10:40:05.117364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b6d2f8a13'
+down_revision = '5a8c0e3b7d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_actors_age', 'actors', ['age'])
+    op.create_index('ix_actors_gender', 'actors', ['gender'])
+    # text_pattern_ops lets postgres use the index for LIKE 'prefix%'
+    # regardless of the database collation
+    op.create_index('ix_movies_title', 'movies', ['title'],
+                    postgresql_ops={'title': 'text_pattern_ops'})
+    op.create_index('ix_movies_release_date', 'movies', ['release_date'])
+
+
+def downgrade():
+    op.drop_index('ix_movies_release_date', table_name='movies')
+    op.drop_index('ix_movies_title', table_name='movies')
+    op.drop_index('ix_actors_gender', table_name='actors')
+    op.drop_index('ix_actors_age', table_name='actors')
@@ -0,0 +1,32 @@
+"""add cast association table
+
+Revision ID: b71f3a9c5e02
+Revises: 9e4b6d2f8a13
+Create Date: 2020-07-21 14:03:58.760215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71f3a9c5e02'
+down_revision = '9e4b6d2f8a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cast',
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['actors.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id', 'actor_id')
+    )
+    op.create_index('ix_cast_actor_id', 'cast', ['actor_id'])
+
+
+def downgrade():
+    op.drop_index('ix_cast_actor_id', table_name='cast')
+    op.drop_table('cast')
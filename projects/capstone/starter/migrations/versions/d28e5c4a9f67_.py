@@ -0,0 +1,86 @@
+"""store movie release dates as dates
+
+Revision ID: d28e5c4a9f67
+Revises: b71f3a9c5e02
+Create Date: 2020-07-23 19:26:41.092583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from dateutil import parser
+
+
+# revision identifiers, used by Alembic.
+revision = 'd28e5c4a9f67'
+down_revision = 'b71f3a9c5e02'
+branch_labels = None
+depends_on = None
+
+movies = sa.table('movies',
+                  sa.column('id', sa.Integer),
+                  sa.column('release_date', sa.String),
+                  sa.column('release_day', sa.Date))
+
+
+def parse_release_date(value):
+    try:
+        return parser.parse(value).date()
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def upgrade():
+    op.add_column('movies', sa.Column('release_day', sa.Date(),
+                                      nullable=True))
+
+    # backfill in python so that one malformed string becomes NULL
+    # instead of failing the whole cast
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([movies.c.id, movies.c.release_date])
+        .where(movies.c.release_date.isnot(None)))
+    backfill = [{'movie_id': movie_id,
+                 'day': parse_release_date(release_date)}
+                for movie_id, release_date in rows]
+    backfill = [row for row in backfill if row['day'] is not None]
+    if backfill:
+        connection.execute(
+            movies.update()
+            .where(movies.c.id == sa.bindparam('movie_id'))
+            .values(release_day=sa.bindparam('day')),
+            backfill)
+
+    op.drop_index('ix_movies_release_date', table_name='movies')
+    with op.batch_alter_table('movies') as batch_op:
+        batch_op.drop_column('release_date')
+        batch_op.alter_column('release_day', new_column_name='release_date',
+                              existing_type=sa.Date())
+    op.create_index('ix_movies_release_date', 'movies', ['release_date'])
+
+
+def downgrade():
+    op.drop_index('ix_movies_release_date', table_name='movies')
+    op.add_column('movies', sa.Column('release_text', sa.String(),
+                                      nullable=True))
+    connection = op.get_bind()
+    text_movies = sa.table('movies',
+                           sa.column('id', sa.Integer),
+                           sa.column('release_date', sa.Date),
+                           sa.column('release_text', sa.String))
+    rows = connection.execute(
+        sa.select([text_movies.c.id, text_movies.c.release_date])
+        .where(text_movies.c.release_date.isnot(None)))
+    backfill = [{'movie_id': movie_id, 'text': release_date.isoformat()}
+                for movie_id, release_date in rows]
+    if backfill:
+        connection.execute(
+            text_movies.update()
+            .where(text_movies.c.id == sa.bindparam('movie_id'))
+            .values(release_text=sa.bindparam('text')),
+            backfill)
+
+    with op.batch_alter_table('movies') as batch_op:
+        batch_op.drop_column('release_date')
+        batch_op.alter_column('release_text', new_column_name='release_date',
+                              existing_type=sa.String())
+    op.create_index('ix_movies_release_date', 'movies', ['release_date'])
@@ -1,24 +1,29 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine, Date
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import (Column, String, Integer, create_engine, Date, Index,
+                        ForeignKey, bindparam, select)
+from fsnd_shared.db_config import engine_options, configure_engine
+from fsnd_shared.db_routing import RoutingSQLAlchemy
 import json
 
 database_name = "casting_agency"
 # database_path = "postgres://{}/{}".format('localhost:5432', database_name)
 database_path = os.environ.get('DATABASE_URL')
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 
 def setup_db(app, database_path=database_path):
     '''
     setup_db(app)
-        binds a flask application and a SQLAlchemy service
+        binds a flask application and a SQLAlchemy service. The schema is
+        left to the migrations, run `python manage.py db upgrade`.
     '''
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                          engine_options(app, database_path))
     db.app = app
     db.init_app(app)
-    db.create_all()
+    configure_engine(app, db.engine)
 
 
 def db_drop_and_create_all():
@@ -33,7 +38,137 @@ def db_drop_and_create_all():
     db.create_all()
 
 
-class Actor(db.Model):
+class SingleStatementMixin:
+    '''
+    SingleStatementMixin
+    writes a row by primary key with a single UPDATE or DELETE instead of
+    loading it into the session first, on postgres the row is read back in
+    the same statement through RETURNING
+    '''
+
+    @classmethod
+    def update_by_id(cls, id, values):
+        '''
+        Returns the updated row, or None if no row has that id.
+        '''
+        table = cls.__table__
+        if not values:
+            row = db.session.execute(
+                table.select().where(table.c.id == id)).first()
+            return row
+
+        statement = table.update().where(table.c.id == id).values(values)
+        if db.engine.dialect.name == 'postgresql':
+            row = db.session.execute(statement.returning(*table.c)).first()
+        else:
+            result = db.session.execute(statement)
+            row = None
+            if result.rowcount:
+                row = db.session.execute(
+                    table.select().where(table.c.id == id)).first()
+        db.session.commit()
+        return row
+
+    @classmethod
+    def delete_by_id(cls, id):
+        '''
+        Returns True if a row was deleted, False if no row has that id.
+        '''
+        table = cls.__table__
+        statement = table.delete().where(table.c.id == id)
+        if db.engine.dialect.name == 'postgresql':
+            deleted = db.session.execute(
+                statement.returning(table.c.id)).first() is not None
+        else:
+            deleted = db.session.execute(statement).rowcount > 0
+        db.session.commit()
+        return deleted
+
+    @classmethod
+    def insert_many(cls, rows):
+        '''
+        Inserts all rows in one transaction and returns their new ids in
+        the same order. On postgres this is a single multi-row INSERT ...
+        RETURNING, rows must all have the same keys.
+        '''
+        table = cls.__table__
+        if db.engine.dialect.name == 'postgresql':
+            result = db.session.execute(
+                table.insert().values(rows).returning(table.c.id))
+            ids = [row.id for row in result]
+        else:
+            ids = [db.session.execute(table.insert(), row)
+                   .inserted_primary_key[0] for row in rows]
+        db.session.commit()
+        return ids
+
+    @classmethod
+    def update_many(cls, rows):
+        '''
+        Applies partial updates, each row has an 'id' and the columns to
+        set. Rows that set the same columns are sent as one executemany
+        UPDATE, everything commits together. Returns the set of ids that
+        exist (and were updated).
+        '''
+        table = cls.__table__
+        ids = {row['id'] for row in rows}
+        existing_ids = {id for (id,) in db.session.execute(
+            select([table.c.id]).where(table.c.id.in_(ids)))}
+
+        groups = {}
+        for row in rows:
+            if row['id'] in existing_ids:
+                columns = tuple(sorted(key for key in row if key != 'id'))
+                groups.setdefault(columns, []).append(row)
+
+        for columns, group in groups.items():
+            statement = (table.update()
+                         .where(table.c.id == bindparam('row_id'))
+                         .values({column: bindparam(column)
+                                  for column in columns}))
+            db.session.execute(statement, [
+                dict({column: row[column] for column in columns},
+                     row_id=row['id'])
+                for row in group
+            ])
+        db.session.commit()
+        return existing_ids
+
+    @classmethod
+    def delete_many(cls, ids):
+        '''
+        Deletes the rows with the given ids in a single statement and
+        returns the set of ids that were deleted.
+        '''
+        table = cls.__table__
+        statement = table.delete().where(table.c.id.in_(ids))
+        if db.engine.dialect.name == 'postgresql':
+            deleted_ids = {row.id for row in db.session.execute(
+                statement.returning(table.c.id))}
+        else:
+            deleted_ids = {id for (id,) in db.session.execute(
+                select([table.c.id]).where(table.c.id.in_(ids)))}
+            db.session.execute(statement)
+        db.session.commit()
+        return deleted_ids
+
+
+'''
+cast
+links actors to the movies they are cast in, the primary key serves
+lookups by movie and ix_cast_actor_id lookups by actor
+'''
+cast = db.Table(
+    'cast',
+    Column('movie_id', Integer,
+           ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True),
+    Column('actor_id', Integer,
+           ForeignKey('actors.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_cast_actor_id', 'actor_id')
+)
+
+
+class Actor(SingleStatementMixin, db.Model):
     '''
     Actor
     '''
@@ -41,8 +176,8 @@ class Actor(db.Model):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    age = Column(Integer)
-    gender = Column(String)
+    age = Column(Integer, index=True)
+    gender = Column(String, index=True)
 
     def __init__(self, name, age, gender):
         self.name = name
@@ -69,15 +204,27 @@ class Actor(db.Model):
         }
 
 
-class Movie(db.Model):
+class Movie(SingleStatementMixin, db.Model):
     '''
     Movie
     '''
     __tablename__ = 'movies'
+    __table_args__ = (
+        # text_pattern_ops so title prefix searches can use the index
+        Index('ix_movies_title', 'title',
+              postgresql_ops={'title': 'text_pattern_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String)
-    release_date = Column(String)
+    release_date = Column(Date, index=True)
+    # the database removes cast rows on delete, so the collections are
+    # never loaded just to be cleared
+    actors = db.relationship('Actor', secondary=cast, passive_deletes=True,
+                             order_by='Actor.id',
+                             backref=db.backref('movies',
+                                                passive_deletes=True,
+                                                order_by='Movie.id'))
 
     def __init__(self, title, release_date):
         self.title = title
@@ -98,5 +245,43 @@ class Movie(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'release_date': self.release_date
+            'release_date': (self.release_date.isoformat()
+                             if self.release_date else None)
         }
+
+    def assign_actors(self, actor_ids):
+        '''
+        Casts the given actors in this movie with one executemany insert.
+        Actors that are already cast are skipped, returns the ids that
+        were newly assigned.
+        '''
+        existing = db.session.query(cast.c.actor_id).filter(
+            cast.c.movie_id == self.id,
+            cast.c.actor_id.in_(actor_ids))
+        existing_ids = {actor_id for (actor_id,) in existing}
+        new_ids = sorted(set(actor_ids) - existing_ids)
+
+        if new_ids:
+            db.session.execute(cast.insert(), [
+                {'movie_id': self.id, 'actor_id': actor_id}
+                for actor_id in new_ids
+            ])
+        db.session.commit()
+        return new_ids
+
+    def unassign_actors(self, actor_ids):
+        '''
+        Removes the given actors from this movie with one delete,
+        returns the ids that were actually cast.
+        '''
+        existing = db.session.query(cast.c.actor_id).filter(
+            cast.c.movie_id == self.id,
+            cast.c.actor_id.in_(actor_ids))
+        removed_ids = sorted(actor_id for (actor_id,) in existing)
+
+        if removed_ids:
+            db.session.execute(cast.delete().where(
+                (cast.c.movie_id == self.id) &
+                cast.c.actor_id.in_(removed_ids)))
+        db.session.commit()
+        return removed_ids
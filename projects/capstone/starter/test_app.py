@@ -1,61 +1,36 @@
 
-import os
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+import pytest
 
-from app import create_app
-from models import setup_db, Actor, Movie, db_drop_and_create_all
+from fsnd_shared import fast_json
+from models import Actor, Movie
 from datetime import date
 
 
 class CastAgencyTestCase(unittest.TestCase):
-    """This class represents the trivia test case"""
-
-    def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
-        self.casting_assistant_token = os.environ['casting_assistant_token']
-        self.casting_director_token = os.environ['casting_director_token']
-        self.executive_producer_token = os.environ['executive_producer_token']
-        self.client = self.app.test_client
-        self.database_name = "cast_agency_test"
-        self.database_path = "postgres://{}/{}".format(
-            'localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
-        db_drop_and_create_all()
-
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-
-        new_actor = {
-            'name': 'Test Name',
-            'age': 25,
-            'gender': 'Male'
-        }
-
-        res = self.client().post('/actors', json=new_actor,
-                                 headers={
-                                    'Authorization': "Bearer {}".format(
-                                        self.executive_producer_token)})
+    """This class represents the casting agency test case"""
 
-        new_movie = {
-            'title': 'Test Movie',
-            'release_date': '2020-06-17'
-        }
+    @pytest.fixture(autouse=True)
+    def setUpFixtures(self, app, db_session, tokens):
+        """Define test variables and seed the test transaction.
 
-        res = self.client().post('/movies', json=new_movie,
-                                 headers={
-                                    'Authorization': "Bearer {}".format(
-                                        self.executive_producer_token)})
+        The schema is created once per session by conftest.py and every
+        test runs in a transaction that is rolled back afterwards, the
+        tokens are signed locally for each role.
+        """
+        self.app = app
+        self.client = self.app.test_client
+        self.casting_assistant_token = tokens['casting_assistant']
+        self.casting_director_token = tokens['casting_director']
+        self.executive_producer_token = tokens['executive_producer']
 
-    def tearDown(self):
-        """Executed after reach test"""
-        pass
+        actor = Actor(name='Test Name', age=25, gender='Male')
+        actor.insert()
+        movie = Movie(title='Test Movie', release_date=date(2020, 6, 17))
+        movie.insert()
+        self.actor_id = actor.id
+        self.movie_id = movie.id
 
     """
     DONE
@@ -72,6 +47,56 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertTrue(len(data['actors']) > 0)
 
+    def test_get_actors_with_filters(self):
+        res = self.client().get('/actors?min_age=20&max_age=30&gender=Male',
+                                headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertTrue(len(data['actors']) > 0)
+        for actor in data['actors']:
+            self.assertTrue(20 <= actor['age'] <= 30)
+            self.assertEqual(actor['gender'], 'Male')
+
+    def test_get_actors_next_page(self):
+        second = Actor(name='Second Name', age=30, gender='Female')
+        second.insert()
+
+        res = self.client().get('/actors?limit=1', headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([actor['id'] for actor in data['actors']],
+                         [self.actor_id])
+        self.assertIsNotNone(data['next'])
+
+        res = self.client().get(
+            '/actors?limit=1&after={}'.format(data['next']),
+            headers={
+                'Authorization': "Bearer {}".format(
+                    self.casting_assistant_token)})
+        next_data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([actor['id'] for actor in next_data['actors']],
+                         [second.id])
+        self.assertIsNone(next_data['next'])
+
+    def test_400_get_actors_invalid_limit(self):
+        res = self.client().get('/actors?limit=1000', headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'bad request')
+
     def test_401_get_actors(self):
         res = self.client().get('/actors')
         data = json.loads(res.data)
@@ -86,7 +111,8 @@ class CastAgencyTestCase(unittest.TestCase):
             'name': 'John Smith',
             'gender': 'Male'
         }
-        res = self.client().patch('/actors/1', json=update_actor,
+        res = self.client().patch(
+            '/actors/{}'.format(self.actor_id), json=update_actor,
                                   headers={
                                     'Authorization': "Bearer {}".format(
                                         self.casting_director_token)})
@@ -96,28 +122,28 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertTrue(len(data['update_actor']) > 0)
 
-    def test_400_fail_to_update_actors(self):
+    def test_404_fail_to_update_actors(self):
         update_actor = {
             'name': 'John Smith',
             'gender': 'Male'
         }
-        res = self.client().patch('/actors/2', json=update_actor,
+        res = self.client().patch('/actors/21234', json=update_actor,
                                   headers={
                                     'Authorization': "Bearer {}".format(
                                         self.casting_director_token)})
         data = json.loads(res.data)
 
-        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.status_code, 404)
         self.assertFalse(data['success'])
-        self.assertEqual(data['error'], 400)
-        self.assertEqual(data['message'], 'bad request')
+        self.assertEqual(data['error'], 404)
+        self.assertEqual(data['message'], 'resource not found')
 
     def test_401_fail_to_update_actors(self):
         update_actor = {
             'name': 'John Smith',
             'gender': 'Male'
         }
-        res = self.client().patch('/actors/2', json=update_actor,
+        res = self.client().patch('/actors/21234', json=update_actor,
                                   headers={
                                     'Authorization': "Bearer {}".format(
                                         self.casting_assistant_token)})
@@ -128,7 +154,8 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertEqual(data['message'], 'authentification failed')
 
     def test_delete_actors_by_id(self):
-        res = self.client().delete('/actors/1',
+        res = self.client().delete(
+            '/actors/{}'.format(self.actor_id),
                                    headers={
                                     'Authorization': "Bearer {}".format(
                                         self.casting_director_token)})
@@ -136,19 +163,19 @@ class CastAgencyTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['success'])
-        self.assertEqual(data['deleted_actor'], 1)
+        self.assertEqual(data['deleted_actor'], self.actor_id)
 
-    def test_400_delete_actors_by_id(self):
+    def test_404_delete_actors_by_id(self):
         res = self.client().delete('/actors/21234',
                                    headers={
                                     'Authorization': "Bearer {}".format(
                                         self.casting_director_token)})
         data = json.loads(res.data)
 
-        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.status_code, 404)
         self.assertFalse(data['success'])
-        self.assertEqual(data['error'], 400)
-        self.assertEqual(data['message'], 'bad request')
+        self.assertEqual(data['error'], 404)
+        self.assertEqual(data['message'], 'resource not found')
 
     def test_401_fail_to_delete_actors(self):
         res = self.client().delete('/actors/2',
@@ -220,6 +247,60 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertTrue(len(data['movies']) > 0)
 
+    def test_get_movies_by_title_prefix(self):
+        res = self.client().get('/movies?title=Test', headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(len(data['movies']) > 0)
+        for movie in data['movies']:
+            self.assertTrue(movie['title'].startswith('Test'))
+
+    def test_get_movies_released_in_range(self):
+        res = self.client().get(
+            '/movies?released_after=2020-06-01&released_before=2020-06-30',
+            headers={
+                'Authorization': "Bearer {}".format(
+                    self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(len(data['movies']) > 0)
+        for movie in data['movies']:
+            self.assertTrue('2020-06-01' <= movie['release_date']
+                            <= '2020-06-30')
+
+    def test_get_movies_same_body_for_every_json_backend(self):
+        bodies = []
+        for backend in sorted(fast_json.BACKENDS):
+            self.app.config['JSON_BACKEND'] = backend
+            try:
+                res = self.client().get('/movies', headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+            finally:
+                self.app.config.pop('JSON_BACKEND')
+            self.assertEqual(res.status_code, 200)
+            bodies.append(json.loads(res.data))
+
+        for body in bodies:
+            self.assertEqual(body, bodies[0])
+        self.assertIn({'id': self.movie_id, 'title': 'Test Movie',
+                       'release_date': '2020-06-17'}, bodies[0]['movies'])
+
+    def test_400_get_movies_invalid_release_date(self):
+        res = self.client().get('/movies?released_after=June',
+                                headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'bad request')
+
     def test_401_get_movies(self):
         res = self.client().get('/movies')
         data = json.loads(res.data)
@@ -235,7 +316,8 @@ class CastAgencyTestCase(unittest.TestCase):
             'release_date': date.today().isoformat()
         }
 
-        res = self.client().patch('/movies/1', json=update_movie,
+        res = self.client().patch(
+            '/movies/{}'.format(self.movie_id), json=update_movie,
                                   headers={
                                     'Authorization': "Bearer {}".format(
                                         self.casting_director_token)})
@@ -245,7 +327,7 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertTrue(len(data['update_movie']) > 0)
 
-    def test_400_fail_to_update_movies(self):
+    def test_404_fail_to_update_movies(self):
         update_movie = {
             'title': 'John Smith',
             'release_date': date.today().isoformat()
@@ -256,10 +338,10 @@ class CastAgencyTestCase(unittest.TestCase):
                                         self.casting_director_token)})
         data = json.loads(res.data)
 
-        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.status_code, 404)
         self.assertFalse(data['success'])
-        self.assertEqual(data['error'], 400)
-        self.assertEqual(data['message'], 'bad request')
+        self.assertEqual(data['error'], 404)
+        self.assertEqual(data['message'], 'resource not found')
 
     def test_401_fail_to_update_movies(self):
         update_movie = {
@@ -277,7 +359,8 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertEqual(data['message'], 'authentification failed')
 
     def test_delete_movies_by_id(self):
-        res = self.client().delete('/movies/1',
+        res = self.client().delete(
+            '/movies/{}'.format(self.movie_id),
                                    headers={
                                     'Authorization': "Bearer {}".format(
                                         self.executive_producer_token)})
@@ -285,19 +368,19 @@ class CastAgencyTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['success'])
-        self.assertEqual(data['deleted_movie'], 1)
+        self.assertEqual(data['deleted_movie'], self.movie_id)
 
-    def test_400_delete_movies_by_id(self):
+    def test_404_delete_movies_by_id(self):
         res = self.client().delete('/movies/21234',
                                    headers={
                                     'Authorization': "Bearer {}".format(
                                         self.executive_producer_token)})
         data = json.loads(res.data)
 
-        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.status_code, 404)
         self.assertFalse(data['success'])
-        self.assertEqual(data['error'], 400)
-        self.assertEqual(data['message'], 'bad request')
+        self.assertEqual(data['error'], 404)
+        self.assertEqual(data['message'], 'resource not found')
 
     def test_401_fail_to_delete_movies(self):
         res = self.client().delete('/movies/1',
@@ -342,6 +425,22 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], 'bad request')
 
+    def test_400_fail_to_add_movies_invalid_release_date(self):
+        new_movie = {
+            'title': 'Inception 2',
+            'release_date': 'next summer'
+        }
+
+        res = self.client().post('/movies', json=new_movie,
+                                 headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.executive_producer_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'bad request')
+
     def test_401_fail_to_add_movies(self):
         new_movie = {
             'title': 'Inception 2',
@@ -358,7 +457,168 @@ class CastAgencyTestCase(unittest.TestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], 'authentification failed')
 
+    def test_assign_and_get_cast(self):
+        headers = {'Authorization': "Bearer {}".format(
+            self.executive_producer_token)}
+        res = self.client().post('/actors', json={
+            'name': 'Cast Member', 'age': 30, 'gender': 'Female'},
+            headers=headers)
+        actor_id = json.loads(res.data)['new_actor']
+        res = self.client().post('/movies', json={
+            'title': 'Cast Movie', 'release_date': '2020-07-01'},
+            headers=headers)
+        movie_id = json.loads(res.data)['new_movie']
+
+        res = self.client().post(
+            '/movies/{}/actors'.format(movie_id),
+            json={'actors': [actor_id]},
+            headers={'Authorization': "Bearer {}".format(
+                self.casting_director_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['assigned'], [actor_id])
+
+        res = self.client().get(
+            '/movies/{}/actors'.format(movie_id),
+            headers={'Authorization': "Bearer {}".format(
+                self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([actor['id'] for actor in data['actors']],
+                         [actor_id])
+
+        res = self.client().get(
+            '/actors/{}/movies'.format(actor_id),
+            headers={'Authorization': "Bearer {}".format(
+                self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([movie['id'] for movie in data['movies']],
+                         [movie_id])
+
+        res = self.client().delete(
+            '/movies/{}/actors'.format(movie_id),
+            json={'actors': [actor_id]},
+            headers={'Authorization': "Bearer {}".format(
+                self.casting_director_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['unassigned'], [actor_id])
+
+    def test_404_get_cast_of_missing_movie(self):
+        res = self.client().get('/movies/21234/actors', headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_400_assign_actors_without_ids(self):
+        res = self.client().post('/movies/1/actors', json={'actors': []},
+                                 headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_director_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'bad request')
+
+    def test_401_fail_to_assign_actors(self):
+        res = self.client().post('/movies/1/actors', json={'actors': [1]},
+                                 headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_assistant_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'authentification failed')
+
+    def test_bulk_add_update_and_delete_actors(self):
+        new_actors = [{'name': 'Bulk {}'.format(i), 'age': 30 + i,
+                       'gender': 'Female'} for i in range(3)]
+
+        res = self.client().post('/actors/bulk', json={'actors': new_actors},
+                                 headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.executive_producer_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual([r['status'] for r in data['results']],
+                         [201, 201, 201])
+        ids = [r['id'] for r in data['results']]
+
+        res = self.client().patch('/actors/bulk',
+                                  json={'actors': [{'id': ids[0], 'age': 50},
+                                                   {'id': 21234, 'age': 50}]},
+                                  headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.executive_producer_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r['status'] for r in data['results']], [200, 404])
+
+        res = self.client().delete('/actors/bulk', json={'actors': ids},
+                                   headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.executive_producer_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r['id'] for r in data['results']], ids)
+        self.assertEqual([r['status'] for r in data['results']],
+                         [200, 200, 200])
+
+    def test_400_bulk_add_movies_reports_every_invalid_item(self):
+        new_movies = [
+            {'title': 'Valid', 'release_date': date.today().isoformat()},
+            {'title': 'No date'},
+            {'title': 'Bad date', 'release_date': 'next summer'}
+        ]
+
+        res = self.client().post('/movies/bulk', json={'movies': new_movies},
+                                 headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.executive_producer_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+        self.assertEqual([e['index'] for e in data['errors']], [1, 2])
+
+    def test_400_bulk_delete_actors_without_object_body(self):
+        res = self.client().delete('/actors/bulk', json=[1, 2],
+                                   headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.executive_producer_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+
+    def test_401_fail_to_bulk_delete_movies(self):
+        res = self.client().delete('/movies/bulk', json={'movies': [1]},
+                                   headers={
+                                    'Authorization': "Bearer {}".format(
+                                        self.casting_director_token)})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'authentification failed')
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
-    unittest.main()
+    pytest.main([__file__])
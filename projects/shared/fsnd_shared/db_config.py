@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+from fsnd_shared.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------------#
+# Settings
+# ----------------------------------------------------------------------------#
+# read with fsnd_shared.settings.get_setting
+DEFAULTS = {
+    # connections kept open, and extra connections allowed during bursts
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    # seconds to wait for a free connection before giving up
+    'DB_POOL_TIMEOUT': 30,
+    # seconds after which a connection is replaced, this has to be shorter
+    # than the idle timeout of the host or of any proxy in between
+    'DB_POOL_RECYCLE': 300,
+    # test each connection with a cheap query when it is checked out
+    'DB_POOL_PRE_PING': True,
+    # milliseconds a statement may run before postgres cancels it, 0 is off
+    'DB_STATEMENT_TIMEOUT': 0,
+    # leave the pooling to PgBouncer (transaction pooling mode)
+    'DB_PGBOUNCER': False,
+    # checkouts that wait longer than this many milliseconds are logged
+    'DB_POOL_WAIT_WARNING': 100
+}
+
+# ----------------------------------------------------------------------------#
+# Pool Wait Time
+# ----------------------------------------------------------------------------#
+class PoolWaitStats:
+    '''
+    PoolWaitStats
+    counts how long checkouts waited for a connection, which includes
+    opening a new one when the pool is allowed to grow
+    '''
+
+    def __init__(self, warning=0.1):
+        self.warning = warning
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def observe(self, wait):
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait >= self.warning:
+                self.slow_checkouts += 1
+        if wait >= self.warning:
+            logger.warning('waited %.1f ms for a database connection',
+                           wait * 1000)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.slow_checkouts,
+                'total_wait_ms': round(self.total_wait * 1000, 3),
+                'average_wait_ms': round(
+                    self.total_wait * 1000 / self.checkouts, 3)
+                if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+
+class TimedQueuePool(QueuePool):
+    '''
+    TimedQueuePool
+    a QueuePool that records how long every checkout waited
+    '''
+
+    def __init__(self, creator, wait_stats=None, **kw):
+        super().__init__(creator, **kw)
+        self.wait_stats = wait_stats if wait_stats is not None \
+            else PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # dispose() replaces the pool, keep counting into the same stats
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+def pool_stats(engine):
+    '''
+    pool_stats(engine)
+        returns the checkout wait times and the current pool usage
+    '''
+    pool = engine.pool
+    stats = {'pool': pool.status()}
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.wait_stats.snapshot())
+        stats['checked_out'] = pool.checkedout()
+        stats['overflow'] = pool.overflow()
+    return stats
+
+
+# ----------------------------------------------------------------------------#
+# Engine
+# ----------------------------------------------------------------------------#
+def is_postgres(database_path):
+    return make_url(database_path).get_backend_name() in (
+        'postgres', 'postgresql')
+
+
+def engine_options(app, database_path):
+    '''
+    engine_options(app, database_path)
+        builds SQLALCHEMY_ENGINE_OPTIONS for the database, sqlite keeps
+        the pool Flask-SQLAlchemy picks for it
+    '''
+    if not database_path or not is_postgres(database_path):
+        return {}
+
+    options = {'pool_pre_ping': get_setting(app, 'DB_POOL_PRE_PING', DEFAULTS)}
+
+    if get_setting(app, 'DB_PGBOUNCER', DEFAULTS):
+        # PgBouncer hands out server connections per transaction: pooling
+        # them again here would only pin idle ones, and it rejects startup
+        # options, so the timeout is set per transaction instead
+        options['poolclass'] = NullPool
+        return options
+
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': get_setting(app, 'DB_POOL_SIZE', DEFAULTS),
+        'max_overflow': get_setting(app, 'DB_MAX_OVERFLOW', DEFAULTS),
+        'pool_timeout': get_setting(app, 'DB_POOL_TIMEOUT', DEFAULTS),
+        'pool_recycle': get_setting(app, 'DB_POOL_RECYCLE', DEFAULTS),
+        'wait_stats': PoolWaitStats(
+            get_setting(app, 'DB_POOL_WAIT_WARNING', DEFAULTS) / 1000)
+    })
+    statement_timeout = get_setting(app, 'DB_STATEMENT_TIMEOUT', DEFAULTS)
+    if statement_timeout:
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(statement_timeout)
+        }
+    return options
+
+
+def configure_engine(app, engine):
+    '''
+    configure_engine(app, engine)
+        sets the statement timeout at the start of every transaction when
+        the connections go through PgBouncer
+    '''
+    statement_timeout = get_setting(app, 'DB_STATEMENT_TIMEOUT', DEFAULTS)
+    if not (statement_timeout and get_setting(app, 'DB_PGBOUNCER', DEFAULTS)):
+        return
+    if engine.dialect.name != 'postgresql':
+        return
+
+    @event.listens_for(engine, 'begin')
+    def set_statement_timeout(connection):
+        connection.execute('SET LOCAL statement_timeout = {:d}'.format(
+            statement_timeout))
@@ -0,0 +1,173 @@
+import math
+import threading
+import time
+from flask import request, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+from fsnd_shared.settings import get_setting
+
+# ----------------------------------------------------------------------------#
+# Settings
+# ----------------------------------------------------------------------------#
+# read with fsnd_shared.settings.get_setting
+DEFAULTS = {
+    # the replica is only used when this is set
+    'DATABASE_REPLICA_URL': None,
+    # seconds the replica may be behind before reads go to the primary
+    'DB_REPLICA_MAX_LAG': 5.0,
+    # seconds between two replica lag checks
+    'DB_REPLICA_LAG_CHECK_INTERVAL': 2.0,
+    # seconds a client keeps reading from the primary after a write
+    'DB_READ_AFTER_WRITE': 5.0
+}
+
+REPLICA = 'replica'
+PRIMARY = 'primary'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# a request with this header set to 1/true always reads from the primary
+PRIMARY_HEADER = 'X-Read-Primary'
+# set after a write, reads stay on the primary until the time it holds
+PRIMARY_COOKIE = 'read_primary_until'
+
+# on postgres 10+, 0 when everything received was replayed, else the age
+# of the last replayed transaction
+LAG_QUERY = '''
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+
+class ReplicaLag:
+    '''
+    ReplicaLag
+    caches how far the replica is behind, so only one request per interval
+    pays for the check. None means the lag is unknown.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.lag = None
+
+    def get(self, engine, interval):
+        now = time.monotonic()
+        with self.lock:
+            if self.checked_at is not None and \
+                    now - self.checked_at < interval:
+                return self.lag
+            self.checked_at = now
+        self.lag = self.measure(engine)
+        return self.lag
+
+    @staticmethod
+    def measure(engine):
+        if engine.dialect.name != 'postgresql':
+            return 0.0
+        try:
+            with engine.connect() as connection:
+                lag = connection.execute(LAG_QUERY).scalar()
+        except Exception:
+            return None
+        return float(lag or 0)
+
+
+# ----------------------------------------------------------------------------#
+# Routing
+# ----------------------------------------------------------------------------#
+class RoutingSession(SignallingSession):
+    '''
+    RoutingSession
+    sends the queries of read-only requests to the replica, flushes and
+    everything outside of a request always go to the primary
+    '''
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and self.db.route(self.app) == REPLICA:
+            return self.db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    '''
+    RoutingSQLAlchemy
+    a SQLAlchemy service whose session reads from DATABASE_REPLICA_URL
+    when it is set. A request reads from the primary when it writes, when
+    it sends the X-Read-Primary header, when the client wrote within the
+    last DB_READ_AFTER_WRITE seconds, or when the replica is more than
+    DB_REPLICA_MAX_LAG seconds behind.
+    '''
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        replica_url = get_setting(app, 'DATABASE_REPLICA_URL', DEFAULTS)
+        if replica_url:
+            binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+            binds.setdefault(REPLICA, replica_url)
+            app.config['SQLALCHEMY_BINDS'] = binds
+        super().init_app(app)
+        if 'replica_lag' not in app.extensions:
+            app.after_request(self.remember_write)
+        app.extensions['replica_lag'] = ReplicaLag()
+
+    def has_replica(self, app):
+        return REPLICA in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+    def route(self, app):
+        '''
+        Returns the database the current request reads from, the choice is
+        made once per request.
+        '''
+        if not has_request_context():
+            return PRIMARY
+        route = getattr(request, 'db_route', None)
+        if route is None:
+            route = request.db_route = self.choose_route(app)
+        return route
+
+    def use_primary(self):
+        '''
+        Makes the rest of the current request read from the primary.
+        '''
+        if has_request_context():
+            request.db_route = PRIMARY
+
+    def choose_route(self, app):
+        if not self.has_replica(app) or request.method not in READ_METHODS:
+            return PRIMARY
+        if request.headers.get(PRIMARY_HEADER, '').lower() in ('1', 'true'):
+            return PRIMARY
+        try:
+            read_primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+        except ValueError:
+            read_primary_until = 0
+        if read_primary_until > time.time():
+            return PRIMARY
+
+        lag = app.extensions['replica_lag'].get(
+            self.get_engine(app, bind=REPLICA),
+            get_setting(app, 'DB_REPLICA_LAG_CHECK_INTERVAL', DEFAULTS))
+        max_lag = get_setting(app, 'DB_REPLICA_MAX_LAG', DEFAULTS)
+        if lag is None or lag > max_lag:
+            return PRIMARY
+        return REPLICA
+
+    def remember_write(self, response):
+        app = self.get_app()
+        if request.method in READ_METHODS or response.status_code >= 400 or \
+                not self.has_replica(app):
+            return response
+        window = get_setting(app, 'DB_READ_AFTER_WRITE', DEFAULTS)
+        if window > 0:
+            response.set_cookie(PRIMARY_COOKIE, str(time.time() + window),
+                                max_age=math.ceil(window), httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,73 @@
+import json
+from datetime import date, datetime
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ----------------------------------------------------------------------------#
+# JSON Backends
+# ----------------------------------------------------------------------------#
+# JSON_BACKEND in the app config picks the encoder: 'orjson', 'json', or
+# 'auto' (the default) for orjson when it is installed
+
+
+def encode_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def stdlib_dumps(data):
+    return json.dumps(data, separators=(',', ':'),
+                      default=encode_default).encode('utf-8')
+
+
+def orjson_dumps(data):
+    return orjson.dumps(data, default=encode_default)
+
+
+BACKENDS = {'json': stdlib_dumps}
+if orjson is not None:
+    BACKENDS['orjson'] = orjson_dumps
+
+
+def get_dumps(app):
+    '''
+    get_dumps(app)
+        returns the function that encodes a response body to bytes
+    '''
+    name = app.config.get('JSON_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in BACKENDS:
+        raise RuntimeError('JSON_BACKEND {!r} is not available, install it '
+                           'or use one of {}'.format(name, sorted(BACKENDS)))
+    return BACKENDS[name]
+
+
+def json_response(data, status=200):
+    '''
+    json_response(data, status)
+        a jsonify() replacement for the list endpoints, the body is encoded
+        in one call without pretty printing or sorting the keys
+    '''
+    return current_app.response_class(
+        get_dumps(current_app)(data), status=status,
+        mimetype=current_app.config['JSONIFY_MIMETYPE'])
+
+
+# ----------------------------------------------------------------------------#
+# Row Serializers
+# ----------------------------------------------------------------------------#
+def row_dicts(query):
+    '''
+    row_dicts(query)
+        runs a column-only query, e.g. db.session.query(Actor.id,
+        Actor.name), and returns its rows as dicts keyed by column name,
+        without building ORM objects
+    '''
+    keys = [column['name'] for column in query.column_descriptions]
+    return [dict(zip(keys, row)) for row in query]
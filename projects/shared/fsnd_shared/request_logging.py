@@ -0,0 +1,196 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+from fsnd_shared.settings import get_setting
+
+# ----------------------------------------------------------------------------#
+# Settings
+# ----------------------------------------------------------------------------#
+# read with fsnd_shared.settings.get_setting
+DEFAULTS = {
+    # file the log is written to, stderr when empty
+    'LOG_FILE': '',
+    'LOG_LEVEL': 'INFO',
+    # size at which the file is rotated, and how many old files are kept
+    'LOG_MAX_BYTES': 10 * 1024 * 1024,
+    'LOG_BACKUP_COUNT': 5,
+    # share of the successful requests that are logged, 1.0 logs all of
+    # them. Errors and slow requests are always logged.
+    'LOG_SAMPLE_RATE': 1.0,
+    # requests slower than this many milliseconds are logged as warnings
+    'LOG_SLOW_REQUEST_MS': 1000,
+    # records waiting for the writer thread, more are dropped
+    'LOG_QUEUE_SIZE': 10000
+}
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# the attributes every LogRecord has, anything else was passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord(
+    '', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+# ----------------------------------------------------------------------------#
+# Records
+# ----------------------------------------------------------------------------#
+class JsonFormatter(logging.Formatter):
+    '''
+    JsonFormatter
+    one JSON object per line, with the fields passed in extra= next to the
+    time, level, logger and message
+    '''
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    '''
+    RequestIdFilter
+    adds the id of the current request to records logged while handling
+    it. It runs on the request thread, before the record is queued.
+    '''
+
+    def filter(self, record):
+        if has_request_context() and not hasattr(record, 'request_id'):
+            record.request_id = getattr(g, 'request_id', None)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    '''
+    NonBlockingQueueHandler
+    hands records to the writer thread. When the queue is full the record
+    is dropped and counted, a request never waits for the log file.
+    '''
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # exceptions are formatted here, the traceback objects must not
+        # leave the request thread
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# ----------------------------------------------------------------------------#
+# Writer
+# ----------------------------------------------------------------------------#
+# one writer thread per log file, shared by every app in the process
+writers = {}
+writers_lock = threading.Lock()
+
+
+def get_queue_handler(app):
+    log_file = get_setting(app, 'LOG_FILE', DEFAULTS)
+    with writers_lock:
+        if log_file not in writers:
+            if log_file:
+                target = RotatingFileHandler(
+                    log_file,
+                    maxBytes=get_setting(app, 'LOG_MAX_BYTES', DEFAULTS),
+                    backupCount=get_setting(app, 'LOG_BACKUP_COUNT', DEFAULTS),
+                    encoding='utf-8')
+            else:
+                target = logging.StreamHandler(sys.stderr)
+            target.setFormatter(JsonFormatter())
+            handler = NonBlockingQueueHandler(
+                queue.Queue(get_setting(app, 'LOG_QUEUE_SIZE', DEFAULTS)))
+            handler.addFilter(RequestIdFilter())
+            listener = QueueListener(handler.queue, target)
+            listener.start()
+            atexit.register(listener.stop)
+            writers[log_file] = handler
+        return writers[log_file]
+
+
+# ----------------------------------------------------------------------------#
+# Setup
+# ----------------------------------------------------------------------------#
+def setup_logging(app):
+    '''
+    setup_logging(app)
+        sends app.logger to a background writer as JSON lines, and logs
+        one record per request with its id, status and latency. The id is
+        taken from the X-Request-ID header or generated, and returned in
+        the same header.
+    '''
+    handler = get_queue_handler(app)
+    app.logger.removeHandler(default_handler)
+    if handler not in app.logger.handlers:
+        app.logger.addHandler(handler)
+    app.logger.setLevel(get_setting(app, 'LOG_LEVEL', DEFAULTS).upper())
+
+    sample_rate = get_setting(app, 'LOG_SAMPLE_RATE', DEFAULTS)
+    slow_request_ms = get_setting(app, 'LOG_SLOW_REQUEST_MS', DEFAULTS)
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or \
+            uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = getattr(g, 'request_started', None)
+        if started is None:
+            return response
+        duration_ms = (time.perf_counter() - started) * 1000
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        if response.status_code >= 500:
+            level = logging.ERROR
+        elif duration_ms > slow_request_ms:
+            level = logging.WARNING
+        elif random.random() < sample_rate:
+            level = logging.INFO
+        else:
+            return response
+        app.logger.log(level, '%s %s %s', request.method, request.path,
+                       response.status_code, extra={
+                           'method': request.method,
+                           'path': request.path,
+                           'status': response.status_code,
+                           'duration_ms': round(duration_ms, 3),
+                           'sampled': level == logging.INFO and
+                           sample_rate < 1
+                       })
+        return response
+
+    return handler
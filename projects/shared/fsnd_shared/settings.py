@@ -0,0 +1,21 @@
+import os
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def get_setting(app, name, defaults):
+    '''
+    get_setting(app, name, defaults)
+        returns the setting from the app config, else from the environment,
+        else defaults[name]. The value is converted to the type of its
+        default, unless that is None; booleans accept 1/true/yes/on.
+    '''
+    default = defaults[name]
+    value = app.config.get(name, os.environ.get(name, default))
+    if default is None or value is None:
+        return value
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.strip().lower() in TRUE_VALUES
+        return bool(value)
+    return type(default)(value)
@@ -0,0 +1,9 @@
+from setuptools import setup
+
+# Modules shared by the Flask apps of the projects. The apps pin Flask and
+# SQLAlchemy themselves, so nothing is required here.
+setup(
+    name='fsnd-shared',
+    version='0.1.0',
+    packages=['fsnd_shared']
+)